@@ -1,9 +1,14 @@
 from flask import request, jsonify
-from import api_bp
+from . import api_bp
 from models import Fund
 from api.schemas import FundSchema
 from extensions import db
 from sqlalchemy.exc import IntegrityError
+import math
+from datetime import datetime, date
+from services.fund_calculations import NAV_FREQUENCIES, calculate_tvpi, calculate_dpi, calculate_rvpi, calculate_nav_series
+from services.portfolio_snapshot import get_portfolio_snapshot
+from services.waterfall import TIERS, WATERFALL_STYLES, load_fund_cash_flows, run_waterfall
 
 fund_schema = FundSchema()
 funds_schema = FundSchema(many=True)
@@ -95,4 +100,210 @@ def get_fund(fund_id):
           description: Fund not found
     """
     fund = Fund.query.get_or_404(fund_id)
-    return jsonify(fund_schema.dump(fund)), 200
\ No newline at end of file
+    return jsonify(fund_schema.dump(fund)), 200
+
+# Example API endpoint for fund metrics
+@api_bp.route('/funds/<int:fund_id>/metrics', methods=['GET'])
+def get_fund_metrics(fund_id):
+    """
+    Retrieves key performance metrics for a specific fund.
+    ---
+    get:
+      summary: Get fund performance metrics
+      parameters:
+        - in: path
+          name: fund_id
+          schema:
+            type: integer
+          required: true
+          description: ID of the fund
+      responses:
+        200:
+          description: Fund metrics
+          content:
+            application/json:
+              schema:
+                type: object
+                properties:
+                  tvpi:
+                    type: number
+                  dpi:
+                    type: number
+                  rvpi:
+                    type: number
+                  # ... other metrics
+        404:
+          description: Fund not found
+    """
+    fund = Fund.query.get_or_404(fund_id)
+    snapshot = get_portfolio_snapshot()  # Refreshed once for all three metrics
+    metrics = {
+        "tvpi": calculate_tvpi(fund.id, snapshot),
+        "dpi": calculate_dpi(fund.id, snapshot),
+        "rvpi": calculate_rvpi(fund.id, snapshot),
+        # Add more metrics here
+    }
+    return jsonify(metrics), 200
+
+@api_bp.route('/funds/<int:fund_id>/nav', methods=['GET'])
+def get_fund_nav(fund_id):
+    """
+    Retrieves a fund's NAV and TVPI time series.
+    ---
+    get:
+      summary: Get fund NAV over time
+      parameters:
+        - in: path
+          name: fund_id
+          schema:
+            type: integer
+          required: true
+          description: ID of the fund
+        - in: query
+          name: from
+          schema:
+            type: string
+            format: date
+          description: First date (YYYY-MM-DD); defaults to January 1st of the vintage year
+        - in: query
+          name: to
+          schema:
+            type: string
+            format: date
+          description: Last date (YYYY-MM-DD); defaults to today
+        - in: query
+          name: freq
+          schema:
+            type: string
+            enum: [D, W, M, Q]
+          description: Point frequency (daily, weekly, month end, quarter end); defaults to M
+      responses:
+        200:
+          description: NAV series
+          content:
+            application/json:
+              schema:
+                type: object
+                properties:
+                  fund_id:
+                    type: integer
+                  freq:
+                    type: string
+                  points:
+                    type: array
+                    items:
+                      type: object
+                      properties:
+                        date:
+                          type: string
+                          format: date
+                        nav:
+                          type: number
+                        paid_in:
+                          type: number
+                        distributions:
+                          type: number
+                        tvpi:
+                          type: number
+        400:
+          description: Invalid date range or frequency
+        404:
+          description: Fund not found
+    """
+    fund = Fund.query.get_or_404(fund_id)
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') \
+            else date(fund.vintage_year, 1, 1)
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else date.today()
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD."}), 400
+    freq = request.args.get('freq', 'M').upper()
+    if freq not in NAV_FREQUENCIES:
+        return jsonify({"error": f"Invalid frequency. Use one of: {', '.join(NAV_FREQUENCIES)}."}), 400
+    if start > end:
+        return jsonify({"error": "'from' must be on or before 'to'."}), 400
+
+    try:
+        points = calculate_nav_series(fund.id, start, end, freq)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"fund_id": fund.id, "freq": freq, "points": points}), 200
+
+@api_bp.route('/funds/<int:fund_id>/waterfall', methods=['GET'])
+def get_fund_waterfall(fund_id):
+    """
+    Models the fund's distribution waterfall and carried interest, liquidating active
+    investments at their latest marks.
+    ---
+    get:
+      summary: Get fund distribution waterfall
+      parameters:
+        - in: path
+          name: fund_id
+          schema:
+            type: integer
+          required: true
+          description: ID of the fund
+        - in: query
+          name: style
+          schema:
+            type: string
+            enum: [european, american]
+          description: Whole-fund (european) or deal-by-deal (american); defaults to european
+        - in: query
+          name: hurdle
+          schema:
+            type: number
+          description: Annual preferred return, e.g. 0.08 (default)
+        - in: query
+          name: carry
+          schema:
+            type: number
+          description: GP carried interest share, e.g. 0.20 (default)
+        - in: query
+          name: catch_up
+          schema:
+            type: number
+          description: GP share of distributions during the catch-up, e.g. 1.0 (default) for a full catch-up
+        - in: query
+          name: mark_multiplier
+          schema:
+            type: number
+          description: Scales unrealized marks for what-if scenarios; defaults to 1.0
+      responses:
+        200:
+          description: Distributions to LPs and the GP by tier
+        400:
+          description: Invalid parameters
+        404:
+          description: Fund not found
+    """
+    fund = Fund.query.get_or_404(fund_id)
+    style = request.args.get('style', 'european').lower()
+    if style not in WATERFALL_STYLES:
+        return jsonify({"error": f"Invalid style. Use one of: {', '.join(WATERFALL_STYLES)}."}), 400
+    try:
+        params = {name: float(request.args.get(name, default))
+                  for name, default in (('hurdle', 0.08), ('carry', 0.20), ('catch_up', 1.0), ('mark_multiplier', 1.0))}
+    except ValueError:
+        return jsonify({"error": "hurdle, carry, catch_up and mark_multiplier must be numbers."}), 400
+    if not all(math.isfinite(value) for value in params.values()):
+        return jsonify({"error": "hurdle, carry, catch_up and mark_multiplier must be finite."}), 400
+    if not (0 <= params['carry'] <= 1 and 0 <= params['catch_up'] <= 1):
+        return jsonify({"error": "carry and catch_up must be between 0 and 1."}), 400
+    if params['hurdle'] < 0 or params['mark_multiplier'] < 0:
+        return jsonify({"error": "hurdle and mark_multiplier can't be negative."}), 400
+
+    cash_flows = load_fund_cash_flows(get_portfolio_snapshot(), [fund.id])
+    result = run_waterfall(cash_flows, style, params['hurdle'], params['carry'], params['catch_up'],
+                           params['mark_multiplier'])
+    totals = {name: round(float(values[0, 0]), 2) if len(cash_flows) else 0.0 for name, values in result.items()}
+    return jsonify({
+        "fund_id": fund.id,
+        "style": style,
+        **params,
+        "tiers": {name: totals[name] for name in TIERS},
+        "distributed": totals['distributed'],
+        "lp_total": totals['lp_total'],
+        "gp_total": totals['gp_total'],
+    }), 200
@@ -0,0 +1,47 @@
+from flask import request, jsonify
+from . import api_bp
+from services.search_index import SEARCH_TYPES, get_search_index
+
+MAX_SEARCH_LIMIT = 50
+
+@api_bp.route('/search', methods=['GET'])
+def search():
+    """
+    Typeahead search over company names, tickers and industries and fund names.
+    ---
+    get:
+      summary: Search companies and funds
+      parameters:
+        - in: query
+          name: q
+          schema:
+            type: string
+          required: true
+          description: Prefix or substring to match (case-insensitive)
+        - in: query
+          name: limit
+          schema:
+            type: integer
+          description: Maximum number of matches (default 10, at most 50)
+        - in: query
+          name: type
+          schema:
+            type: string
+            enum: [company, fund]
+          description: Only return this kind of entity
+      responses:
+        200:
+          description: Matches, best first (exact, then prefix, word prefix and substring matches)
+        400:
+          description: Invalid limit or type
+    """
+    query = request.args.get('q', '')
+    try:
+        limit = min(int(request.args.get('limit', 10)), MAX_SEARCH_LIMIT)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer."}), 400
+    entity_type = request.args.get('type')
+    if entity_type and entity_type not in SEARCH_TYPES:
+        return jsonify({"error": f"Invalid type. Use one of: {', '.join(SEARCH_TYPES)}."}), 400
+
+    return jsonify(get_search_index().search(query, limit, entity_type)), 200
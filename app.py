@@ -5,20 +5,21 @@ import os
 from flasgger import Swagger
 from extensions import db, ma, migrate, jwt
 from flask_migrate import Migrate
-from flask_sqlalchemy import SQLAlchemy
+from services.request_profiler import init_request_profiler
+from services.search_index import init_search_index
 
-db = SQLAlchemy(app)
-
-def create_app():
+def create_app(test_config=None):
     app = Flask(__name__)
 
     # Load configuration
+    app.config.from_object(Config)
     env = os.environ.get('FLASK_ENV', 'development')
     if env == 'development':
         app.config.from_object(DevelopmentConfig)
     else:
         app.config.from_object(ProductionConfig)
-        app.config.from_object(Config)
+    if test_config:
+        app.config.update(test_config)
 
      # Access SQLALCHEMY_DATABASE_URI configuration value
     db_uri = app.config['SQLALCHEMY_DATABASE_URI']
@@ -28,9 +29,11 @@ def create_app():
     ma.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)  # Initialize JWT
+    init_request_profiler(app)  # No-op unless PROFILING_ENABLED
+    init_search_index(app)
 
     # Register blueprints
-    from .api import api_bp
+    from api import api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
 
     # Basic route for health check
@@ -1,9 +1,21 @@
+import argparse
 import timeit
-from app import create_app
+import tracemalloc
+import json
+import os
+import tempfile
+import time
+import numpy as np
 from extensions import db
 from models import Fund, Company, Investment, FinancialData
 from datetime import date
 from decimal import Decimal
+from datetime import datetime
+from services.portfolio_snapshot import PortfolioSnapshot
+from services.price_store import (CURRENT_FILE, DATES_FILE, PRICES_FILE, TICKERS_FILE, PriceStore, PublicPositions,
+                                  mark_to_market)
+from services.waterfall import FundCashFlows, run_waterfall
+from services.search_index import SearchIndex
 
 def setup_data_for_benchmarking(app):
     with app.app_context():
@@ -44,6 +56,8 @@ def setup_data_for_benchmarking(app):
 
 
 def benchmark_fund_metrics_calculation():
+    from app import create_app  # Only this benchmark needs the full app
+
     app = create_app()
     app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:///vc_fund_benchmark.db" # Use a separate DB for benchmark
     setup_data_for_benchmarking(app) # Setup data before benchmarking
@@ -62,5 +76,143 @@ def benchmark_fund_metrics_calculation():
         avg_time = sum(times) / len(times)
         print(f"\nAverage TVPI calculation time: {avg_time:.4f} seconds")
 
+def _investment_values(i):
+    return dict(
+        id=i, fund_id=i % 1000, company_id=i, investment_date=date(2021, 1, 1),
+        amount_invested=Decimal('50000.00'), equity_percentage=Decimal('5.00'), exit_date=None,
+        exit_amount=None, status='Active', updated_at=datetime(2024, 1, 1)
+    )
+
+
+def _traced_bytes(build):
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, result
+
+
+def benchmark_snapshot_memory(positions=100000):
+    """Compares memory held by ORM Investment objects vs the compact portfolio snapshot."""
+    orm_bytes, _ = _traced_bytes(lambda: [
+        Investment(created_at=datetime(2024, 1, 1), valuation_at_investment=Decimal('1000000.00'),
+                   **_investment_values(i))
+        for i in range(positions)
+    ])
+
+    def build_snapshot():
+        snapshot = PortfolioSnapshot()
+        snapshot.load_rows((tuple(_investment_values(i).values()) for i in range(positions)), [])
+        return snapshot
+    snapshot_bytes, _ = _traced_bytes(build_snapshot)
+
+    scale = 1000000 / positions
+    print(f"ORM Investment objects: {orm_bytes * scale / 2**20:.0f} MiB per 1M positions")
+    print(f"Portfolio snapshot:     {snapshot_bytes * scale / 2**20:.0f} MiB per 1M positions")
+    print(f"Reduction:              {orm_bytes / snapshot_bytes:.1f}x")
+
+def benchmark_mark_to_market(tickers=3000, trading_days=2520, positions=20000, funds=100):
+    """Times a vectorized revaluation of every public position over ~10 years of daily prices."""
+    rng = np.random.default_rng(0)
+    start = date(2015, 1, 1).toordinal()
+    with tempfile.TemporaryDirectory() as store_dir:
+        prices = rng.uniform(1, 500, size=(trading_days, tickers))
+        prices[rng.random(prices.shape) < 0.02] = np.nan  # Missing closes
+        # Same layout import_price_files publishes, without round-tripping 7.5M closes through CSV
+        version = f"v{time.time_ns():020d}"
+        os.makedirs(os.path.join(store_dir, version))
+        np.save(os.path.join(store_dir, version, PRICES_FILE), prices)
+        np.save(os.path.join(store_dir, version, DATES_FILE), np.arange(start, start + trading_days, dtype=np.int32))
+        with open(os.path.join(store_dir, version, TICKERS_FILE), 'w') as f:
+            json.dump([f"T{i}" for i in range(tickers)], f)
+        with open(os.path.join(store_dir, CURRENT_FILE), 'w') as f:
+            f.write(version)
+        store = PriceStore(store_dir)
+
+        book = PublicPositions(
+            fund_ids=rng.integers(0, funds, positions),
+            columns=rng.integers(0, tickers, positions),
+            shares=rng.uniform(1000, 100000, positions),
+            start_ordinals=start + rng.integers(0, trading_days, positions),
+            end_ordinals=np.full(positions, date.max.toordinal() + 1),
+        )
+        t = time.perf_counter()
+        dates, _, _ = mark_to_market(store, book, date.fromordinal(start), date.fromordinal(start + trading_days - 1))
+        elapsed = time.perf_counter() - t
+    print(f"Marked {positions} positions x {len(dates)} dates in {elapsed:.2f} seconds "
+          f"({positions * len(dates) / elapsed / 1e6:.0f}M position-days/second)")
+
+def benchmark_waterfall_scenarios(funds=200, deals_per_fund=40, scenarios=500):
+    """Times European and American waterfalls for every fund under many scenarios in one batch."""
+    rng = np.random.default_rng(0)
+    deals = funds * deals_per_fund
+    contributed = rng.uniform(1e5, 5e6, deals)
+    exited = rng.random(deals) < 0.4
+    multiples = rng.lognormal(0.0, 1.0, deals)
+    cash_flows = FundCashFlows(
+        fund_ids=np.arange(funds),
+        deal_fund_ids=np.repeat(np.arange(funds), deals_per_fund),
+        contributed=contributed,
+        realized=np.where(exited, contributed * multiples, 0.0),
+        unrealized=np.where(exited, 0.0, contributed * multiples),
+        years=rng.uniform(0.5, 10, deals),
+    )
+    hurdle = rng.uniform(0.06, 0.10, scenarios)
+    carry = rng.choice([0.20, 0.25, 0.30], scenarios)
+    mark_multipliers = rng.uniform(0.3, 2.0, scenarios)
+
+    for style in ('european', 'american'):
+        t = time.perf_counter()
+        run_waterfall(cash_flows, style, hurdle, carry, 1.0, mark_multipliers)
+        elapsed = time.perf_counter() - t
+        print(f"{style.title()} waterfall: {scenarios} scenarios x {funds} funds ({deals} deals) in {elapsed:.3f} seconds "
+              f"({scenarios * funds / elapsed:,.0f} fund-scenarios/second)")
+
+def benchmark_search(companies=100000, funds=5000, queries=2000):
+    """Times typeahead queries against an index of synthetic companies and funds."""
+    rng = np.random.default_rng(0)
+    syllables = np.array([c + v for c in 'bcdfghjklmnprstvwz' for v in 'aeiou'])
+    industries = ['Tech', 'Biotech', 'Fintech', 'Healthcare', 'Energy', 'Retail', 'Logistics', 'Media']
+    words = [''.join(parts).capitalize() for parts in rng.choice(syllables, (companies + funds, 3))]
+
+    entities = [('company', i, {'name': f"{words[i]} {words[i + 1][:4]} {i}", 'ticker_symbol': words[i][:4].upper(),
+                                'industry': industries[i % len(industries)]})
+                for i in range(companies)]
+    entities += [('fund', i, {'name': f"{words[companies + i]} Ventures Fund {i}"}) for i in range(funds)]
+    index = SearchIndex()
+    t = time.perf_counter()
+    index.load(entities)
+    print(f"Built search index of {len(index)} entities in {time.perf_counter() - t:.2f} seconds")
+
+    names = [entity['name'].lower() for entity in rng.choice(list(index.entities.values()), queries)]
+    workloads = {
+        '2-char prefix': [name[:2] for name in names],
+        '4-char prefix': [name[:4] for name in names],
+        'substring': [name[3:8] for name in names],
+        'no match': ['zzzq' + name[:3] for name in names],
+    }
+    for label, terms in workloads.items():
+        latencies = []
+        for term in terms:
+            t = time.perf_counter()
+            index.search(term, limit=10)
+            latencies.append(time.perf_counter() - t)
+        latencies.sort()
+        print(f"{label:<14} p50 {latencies[len(latencies) // 2] * 1e6:7.1f} us   "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:7.1f} us")
+
+BENCHMARKS = {
+    'metrics': benchmark_fund_metrics_calculation,
+    'snapshot': benchmark_snapshot_memory,
+    'mark-to-market': benchmark_mark_to_market,
+    'waterfall': benchmark_waterfall_scenarios,
+    'search': benchmark_search,
+}
+
 if __name__ == '__main__':
-    benchmark_fund_metrics_calculation()
+    parser = argparse.ArgumentParser(description="Run the benchmarks (all of them by default).")
+    parser.add_argument('--only', action='append', choices=list(BENCHMARKS),
+                        help="Run just this benchmark; repeat to run several")
+    args = parser.parse_args()
+    for name in args.only or BENCHMARKS:
+        BENCHMARKS[name]()
@@ -2,4 +2,23 @@ import os
 class Config:
 	SECRET_KEY = os.environ.get('SECRET_KEY') or 'a very secret and hard to guess string'  # Change in production
 	SQLALCHEMY_TRACK_MODIFICATIONS = False
-	
\ No newline at end of file
+
+	# Per-request profiling (services/request_profiler.py). Off unless explicitly enabled.
+	PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+	PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE') or 0.0)  # 0.0 - 1.0 of all requests
+	PROFILING_HEADER = 'X-Profile-Request'  # Set on a request authenticated as a profiling admin to profile it
+	# JWT identities allowed to trigger profiles and read captures (comma-separated); nobody by default
+	PROFILING_ADMINS = [admin.strip() for admin in os.environ.get('PROFILING_ADMINS', '').split(',') if admin.strip()]
+	PROFILING_DIR = os.environ.get('PROFILING_DIR') or 'profiles'
+	PROFILING_MAX_CAPTURES = int(os.environ.get('PROFILING_MAX_CAPTURES') or 50)
+
+	# Seconds between portfolio snapshot refreshes per worker (0 = check for changes on every metrics request)
+	PORTFOLIO_SNAPSHOT_REFRESH_SECONDS = float(os.environ.get('PORTFOLIO_SNAPSHOT_REFRESH_SECONDS') or 0.0)
+
+	# Memory-mapped daily price store for public holdings (services/price_store.py)
+	PRICE_STORE_DIR = os.environ.get('PRICE_STORE_DIR') or 'instance/price_store'
+
+	# Typeahead search index (services/search_index.py): build it in the background when a worker starts,
+	# and pick up other workers' company and fund writes every this many seconds
+	SEARCH_INDEX_WARM = os.environ.get('SEARCH_INDEX_WARM', 'true').lower() in ('1', 'true', 'yes')
+	SEARCH_INDEX_REFRESH_SECONDS = float(os.environ.get('SEARCH_INDEX_REFRESH_SECONDS') or 5.0)
@@ -0,0 +1,233 @@
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal
+
+import requests
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+# Default request mix, as relative weights. Override with --mix, e.g.
+#   --mix funds=5,metrics=3,search=1,create_fund=1
+DEFAULT_MIX = {
+    'funds': 4,
+    'metrics': 4,
+    'search': 1,
+    'create_fund': 1,
+}
+
+
+def build_app(db_path):
+    """Creates the app from `create_app` against a throwaway SQLite database."""
+    from app import create_app
+
+    return create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{db_path}"})
+
+
+def seed_database(app, num_funds, companies_per_fund):
+    """Seeds funds, companies, investments and one valuation mark per company."""
+    from extensions import db
+    from models import Fund, Company, Investment, FinancialData
+
+    with app.app_context():
+        db.create_all()
+        print(f"Seeding {num_funds} funds x {companies_per_fund} companies...")
+        company_ids = []
+        fund_ids = []
+        for i in range(1, num_funds + 1):
+            fund = Fund(name=f"Load Test Fund {i}", target_size=Decimal('10000000.00'), vintage_year=2020 + (i % 5))
+            db.session.add(fund)
+            db.session.flush()
+            fund_ids.append(fund.id)
+
+            for j in range(1, companies_per_fund + 1):
+                company = Company(name=f"Load Test Company {i}-{j}", industry="Tech", is_public=False)
+                db.session.add(company)
+                db.session.flush()
+                company_ids.append(company.id)
+
+                db.session.add(Investment(
+                    fund_id=fund.id,
+                    company_id=company.id,
+                    investment_date=date(2021, 1, 1),
+                    amount_invested=Decimal('50000.00'),
+                    equity_percentage=Decimal('5.0'),
+                    valuation_at_investment=Decimal('1000000.00')
+                ))
+                db.session.add(FinancialData(
+                    company_id=company.id,
+                    data_date=date(2022, 1, 1),
+                    revenue=Decimal('1000000.00'),
+                    net_income=Decimal('100000.00'),
+                    valuation=Decimal('2000000.00')
+                ))
+        db.session.commit()
+        print("Seeding complete.")
+        return fund_ids, company_ids
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    # Per-request access logging would dominate the measurements
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class LiveServer:
+    """Serves the app on a local port from a background thread."""
+
+    def __init__(self, app, host='127.0.0.1', port=0):
+        self.server = make_server(host, port, app, threaded=True, request_handler=QuietRequestHandler)
+        self.base_url = f"http://{host}:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.thread.join()
+
+
+def parse_mix(mix_str):
+    """Parses 'funds=4,metrics=4' into a weights dict, validating the request kinds."""
+    mix = {}
+    for part in mix_str.split(','):
+        kind, _, weight = part.partition('=')
+        kind = kind.strip()
+        if kind not in DEFAULT_MIX:
+            raise ValueError(f"Unknown request kind '{kind}'. Choose from: {', '.join(DEFAULT_MIX)}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+class LoadTest:
+    def __init__(self, base_url, fund_ids, company_ids, mix, timeout=10):
+        self.base_url = base_url
+        self.fund_ids = fund_ids
+        self.company_ids = company_ids
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Each created fund needs a unique name
+        self._write_counter = 0
+
+    def _session(self):
+        # One keep-alive session per client thread
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _next_fund_name(self):
+        with self._lock:
+            self._write_counter += 1
+            return f"Load Test Written Fund {self._write_counter}"
+
+    def preflight(self):
+        """
+        Sends one request of each kind in the mix and raises if any fails, so the run never ends up
+        timing error responses from routes that don't work.
+        """
+        for kind in self.kinds:
+            try:
+                response = self.send(kind)
+            except requests.exceptions.RequestException as e:
+                raise RuntimeError(f"Preflight '{kind}' request failed: {e}") from e
+            if not 200 <= response.status_code < 300:
+                raise RuntimeError(f"Preflight '{kind}' request failed: {response.request.method} {response.url} "
+                                   f"returned {response.status_code}")
+
+    def send(self, kind):
+        session = self._session()
+        if kind == 'funds':
+            return session.get(f"{self.base_url}/api/funds", timeout=self.timeout)
+        if kind == 'metrics':
+            fund_id = random.choice(self.fund_ids)
+            return session.get(f"{self.base_url}/api/funds/{fund_id}/metrics", timeout=self.timeout)
+        if kind == 'search':
+            return session.get(f"{self.base_url}/api/search", timeout=self.timeout,
+                               params={"q": f"Load Test Company {random.randint(1, len(self.fund_ids))}-"})
+        if kind == 'create_fund':
+            return session.post(f"{self.base_url}/api/funds", timeout=self.timeout,
+                                json={"name": self._next_fund_name(), "target_size": 10000000.00, "vintage_year": 2024})
+        raise ValueError(f"Unknown request kind '{kind}'")
+
+    def _timed_request(self, kind):
+        start = time.perf_counter()
+        try:
+            response = self.send(kind)
+            ok = 200 <= response.status_code < 300
+        except requests.exceptions.RequestException:
+            ok = False
+        return kind, time.perf_counter() - start, ok
+
+    def run(self, num_requests, clients):
+        kinds = random.choices(self.kinds, weights=self.weights, k=num_requests)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            results = list(executor.map(self._timed_request, kinds))
+        return results, time.perf_counter() - start
+
+
+def report(results, elapsed):
+    by_kind = defaultdict(list)
+    for kind, latency, ok in results:
+        by_kind[kind].append((latency, ok))
+    by_kind['all'] = [(latency, ok) for _, latency, ok in results]
+
+    print(f"\n{'request':<16}{'count':>8}{'errors':>8}{'err %':>8}{'req/s':>10}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for kind, samples in by_kind.items():
+        latencies = sorted(latency for latency, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+        print(f"{kind:<16}{len(samples):>8}{errors:>8}{100 * errors / len(samples):>8.1f}"
+              f"{len(samples) / elapsed:>10.1f}"
+              f"{percentile(latencies, 50) * 1000:>10.2f}"
+              f"{percentile(latencies, 95) * 1000:>10.2f}"
+              f"{percentile(latencies, 99) * 1000:>10.2f}")
+    print(f"\nTotal: {len(results)} requests in {elapsed:.2f} seconds")
+
+
+def run_load_test(num_funds=20, companies_per_fund=10, num_requests=2000, clients=16, mix=None, port=0):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = build_app(os.path.join(tmp_dir, 'vc_fund_load_test.db'))
+        fund_ids, company_ids = seed_database(app, num_funds, companies_per_fund)
+
+        with LiveServer(app, port=port) as server:
+            print(f"Serving on {server.base_url}")
+            load_test = LoadTest(server.base_url, fund_ids, company_ids, mix or DEFAULT_MIX)
+            load_test.preflight()
+            print(f"Running {num_requests} requests from {clients} concurrent clients...")
+            results, elapsed = load_test.run(num_requests, clients)
+
+        report(results, elapsed)
+        return results, elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Offline concurrent load test against a seeded local database.")
+    parser.add_argument('--funds', type=int, default=20, help="Number of funds to seed")
+    parser.add_argument('--companies-per-fund', type=int, default=10, help="Companies (and investments) per fund")
+    parser.add_argument('--requests', type=int, default=2000, help="Total number of requests to send")
+    parser.add_argument('--clients', type=int, default=16, help="Number of concurrent clients")
+    parser.add_argument('--mix', type=parse_mix, default=None,
+                        help="Request weights, e.g. funds=4,metrics=4,search=1,create_fund=1")
+    parser.add_argument('--port', type=int, default=0, help="Local port to serve on (0 picks a free port)")
+    args = parser.parse_args()
+
+    run_load_test(args.funds, args.companies_per_fund, args.requests, args.clients, args.mix, args.port)
@@ -10,7 +10,7 @@ class Fund(db.Model):
     invested_capital = db.Column(db.Numeric(15, 2), default=0.0)
     vintage_year = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # Search index refresh deltas
 
     investments = db.relationship('Investment', backref='fund', lazy=True)
 
@@ -26,7 +26,7 @@ class Company(db.Model):
     is_public = db.Column(db.Boolean, default=False)
     ticker_symbol = db.Column(db.String(10))  # For public companies
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # Search index refresh deltas
 
     investments = db.relationship('Investment', backref='company', lazy=True)
     financial_data = db.relationship('FinancialData', backref='company', lazy=True)
@@ -47,7 +47,7 @@ class Investment(db.Model):
     exit_amount = db.Column(db.Numeric(15, 2))
     status = db.Column(db.String(20), default='Active', nullable=False)  # e.g., Active, Exited, Write-off
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # Snapshot refresh deltas
 
     def __repr__(self):
         return f"<Investment {self.fund_id} in {self.company_id} amount {self.amount_invested}>"
@@ -63,7 +63,7 @@ class FinancialData(db.Model):
     stock_price = db.Column(db.Numeric(10, 4))  # For public companies
     # Add more financial metrics as needed (e.g., EBITDA, cash flow, etc.)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # Snapshot refresh deltas
 
     __table_args__ = (db.UniqueConstraint('company_id', 'data_date', name='_company_data_date_uc'),)
 
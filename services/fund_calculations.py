@@ -1,7 +1,23 @@
+from flask import current_app
 from models import Fund, Investment, FinancialData
 from extensions import db
 from datetime import datetime, date
 from decimal import Decimal
+from collections import OrderedDict
+from itertools import groupby
+from operator import itemgetter
+from sqlalchemy import func
+import calendar
+import threading
+import numpy as np
+from services.portfolio_snapshot import get_portfolio_snapshot, NO_DATE
+from services.price_store import get_price_store, load_public_positions, position_prices
+
+NAV_FREQUENCIES = ('D', 'W', 'M', 'Q')
+MAX_NAV_POINTS = 5000
+# Bounds on the per-worker cache of closed NAV points
+MAX_NAV_CACHE_FUNDS = 256
+MAX_NAV_CACHE_POINTS = MAX_NAV_POINTS
 
 # Helper to get current valuation of an investment
 def get_current_investment_valuation(investment: Investment) -> Decimal:
@@ -19,94 +35,233 @@ def get_current_investment_valuation(investment: Investment) -> Decimal:
     return Decimal('0') # Default to 0 if no current data or exited without amount
 
 # Example: Total Value to Paid-in (TVPI)
-def calculate_tvpi(fund_id: int) -> Decimal:
+def calculate_tvpi(fund_id: int, snapshot=None) -> Decimal:
     """
     Calculates the Total Value to Paid-in (TVPI) for a given fund.
     TVPI = (Distributions + Remaining Value) / Paid-in Capital
+    Pass `snapshot` to reuse one already refreshed for this request.
     """
-    fund = Fund.query.get_or_404(fund_id)
-    total_paid_in = sum(inv.amount_invested for inv in fund.investments)
-    if total_paid_in == Decimal('0'):
+    Fund.query.get_or_404(fund_id)
+    if snapshot is None:
+        snapshot = get_portfolio_snapshot()
+    total_paid_in, total_distributions, total_remaining_value = snapshot.fund_totals(fund_id)
+    if total_paid_in == 0:
         return Decimal('0')
 
-    total_distributions = sum(inv.exit_amount for inv in fund.investments if inv.exit_amount)
-    total_remaining_value = sum(get_current_investment_valuation(inv) for inv in fund.investments if inv.status == 'Active')
-
-    tvpi = (total_distributions + total_remaining_value) / total_paid_in
+    tvpi = Decimal(total_distributions + total_remaining_value) / Decimal(total_paid_in)
     return round(tvpi, 4)
 
 # Example: Distributions to Paid-in (DPI)
-def calculate_dpi(fund_id: int) -> Decimal:
+def calculate_dpi(fund_id: int, snapshot=None) -> Decimal:
     """
     Calculates the Distributions to Paid-in (DPI) for a given fund.
     DPI = Distributions / Paid-in Capital
+    Pass `snapshot` to reuse one already refreshed for this request.
     """
-    fund = Fund.query.get_or_404(fund_id)
-    total_paid_in = sum(inv.amount_invested for inv in fund.investments)
-    if total_paid_in == Decimal('0'):
+    Fund.query.get_or_404(fund_id)
+    if snapshot is None:
+        snapshot = get_portfolio_snapshot()
+    total_paid_in, total_distributions, _ = snapshot.fund_totals(fund_id)
+    if total_paid_in == 0:
         return Decimal('0')
 
-    total_distributions = sum(inv.exit_amount for inv in fund.investments if inv.exit_amount)
-    dpi = total_distributions / total_paid_in
+    dpi = Decimal(total_distributions) / Decimal(total_paid_in)
     return round(dpi, 4)
 
 # Example: Remaining Value to Paid-in (RVPI)
-def calculate_rvpi(fund_id: int) -> Decimal:
+def calculate_rvpi(fund_id: int, snapshot=None) -> Decimal:
     """
     Calculates the Remaining Value to Paid-in (RVPI) for a given fund.
     RVPI = Remaining Value / Paid-in Capital
+    Pass `snapshot` to reuse one already refreshed for this request.
     """
-    fund = Fund.query.get_or_404(fund_id)
-    total_paid_in = sum(inv.amount_invested for inv in fund.investments)
-    if total_paid_in == Decimal('0'):
+    Fund.query.get_or_404(fund_id)
+    if snapshot is None:
+        snapshot = get_portfolio_snapshot()
+    total_paid_in, _, total_remaining_value = snapshot.fund_totals(fund_id)
+    if total_paid_in == 0:
         return Decimal('0')
 
-    total_remaining_value = sum(get_current_investment_valuation(inv) for inv in fund.investments if inv.status == 'Active')
-    rvpi = total_remaining_value / total_paid_in
+    rvpi = Decimal(total_remaining_value) / Decimal(total_paid_in)
     return round(rvpi, 4)
 
-# TODO: Implement more complex calculations like IRR (requires a more sophisticated library or custom algo)
-# You'd need to use a financial library like numpy_financial for XIRR/IRR.
-# pip install numpy-financial
+def _too_many_nav_points():
+    return ValueError(f"Date range too long; at most {MAX_NAV_POINTS} points per request.")
+
+def nav_dates(start: date, end: date, freq: str = 'M') -> list:
+    """
+    Period-end dates in [start, end] for a frequency (D daily, W weeks ending Sunday,
+    M month ends, Q quarter ends), plus `end` itself when it falls inside an open period.
+    """
+    if freq in ('D', 'W'):
+        # Work in ordinals so ranges ending near date.max can't overflow
+        first = start.toordinal() + (0 if freq == 'D' else 6 - start.weekday())
+        ordinals = range(first, end.toordinal() + 1, 1 if freq == 'D' else 7)
+        if len(ordinals) > MAX_NAV_POINTS:
+            raise _too_many_nav_points()
+        dates = [date.fromordinal(ordinal) for ordinal in ordinals]
+    else:
+        step = 1 if freq == 'M' else 3
+        year, month = start.year, start.month if freq == 'M' else (start.month - 1) // 3 * 3 + 3
+        dates = []
+        while year <= end.year:
+            period_end = date(year, month, calendar.monthrange(year, month)[1])
+            if period_end > end:
+                break
+            dates.append(period_end)
+            if len(dates) > MAX_NAV_POINTS:
+                raise _too_many_nav_points()
+            year, month = (year + 1, month + step - 12) if month + step > 12 else (year, month + step)
+    if not dates or dates[-1] != end:
+        dates.append(end)
+    if len(dates) > MAX_NAV_POINTS:
+        raise _too_many_nav_points()
+    return dates
+
+def _nav_points(positions, ordinals, store=None, public=None):
+    """
+    Point-in-time paid-in, distributions and NAV for every target date in one pass.
+    Each held position is valued at its equity share of the company's latest valuation on or before
+    each date (an as-of join; marks without a valuation are skipped). Unlike
+    get_current_investment_valuation there is no fallback to the exit amount: that only counts, as a
+    distribution, from the exit date on. Exits without an exit date aren't counted here at all.
+    Public positions in `public` are marked to market from the price store instead, on every date
+    their own ticker has a recent close.
+    """
+    targets = np.asarray(ordinals, dtype=np.int64)[:, None]
+    if not positions:
+        zeros = np.zeros(len(ordinals))
+        return zeros, zeros, zeros
+
+    rows, company_ids, investment_dates, amounts, equity, exit_dates, exit_amounts, is_active = \
+        (np.asarray(column) for column in zip(*positions))
+    companies = np.unique(company_ids)
+
+    # As-of join: for each company, the index of the latest valuation on or before each target date
+    valuations = np.zeros((len(ordinals), len(companies)))
+    marks = db.session.query(FinancialData.company_id, FinancialData.data_date, FinancialData.valuation)\
+                      .filter(FinancialData.company_id.in_(companies.tolist()),
+                              FinancialData.valuation.isnot(None),
+                              FinancialData.data_date <= date.fromordinal(max(ordinals)))\
+                      .order_by(FinancialData.company_id, FinancialData.data_date)
+    for company_id, company_marks in groupby(marks, key=itemgetter(0)):
+        company_marks = list(company_marks)
+        mark_dates = np.array([mark[1].toordinal() for mark in company_marks])
+        mark_values = np.array([float(mark[2]) for mark in company_marks])
+        latest = np.searchsorted(mark_dates, targets[:, 0], side='right') - 1
+        column = np.searchsorted(companies, company_id)
+        valuations[:, column] = np.where(latest >= 0, mark_values[np.maximum(latest, 0)], 0.0)
+
+    position_valuations = valuations[:, np.searchsorted(companies, company_ids)]  # dates x positions
+    values = position_valuations * equity / 100
+    if public is not None and len(public):
+        # A public position's market value replaces its mark on every date its ticker has a recent close
+        priced = np.isin(rows, public.rows)
+        order = np.argsort(public.rows)
+        public_columns = order[np.searchsorted(public.rows, rows[priced], sorter=order)]
+        market = position_prices(store, public, ordinals)[:, public_columns] * public.shares[public_columns]
+        values[:, priced] = np.where(np.isnan(market), values[:, priced], market)
+    invested = investment_dates <= targets
+    exited = (exit_dates != NO_DATE) & (exit_dates <= targets)
+    # Without an exit date, only positions that are still active count as held
+    held = invested & np.where(exit_dates != NO_DATE, targets < exit_dates, is_active.astype(bool))
+
+    paid_in = np.where(invested, amounts, 0.0).sum(axis=1)
+    distributions = np.where(exited, exit_amounts, 0.0).sum(axis=1)
+    nav = np.where(held, values, 0.0).sum(axis=1)
+    return paid_in, distributions, nav
 
-# Example API endpoint for fund metrics
-@api_bp.route('/funds/<int:fund_id>/metrics', methods=['GET'])
-def get_fund_metrics(fund_id):
+def _nav_cache_stamp(positions, store):
+    """Changes whenever the fund's investments, any of its companies' marks or the price store change."""
+    company_ids = list({position[1] for position in positions})
+    marks_stamp = db.session.query(func.count(FinancialData.id), func.max(FinancialData.updated_at))\
+                            .filter(FinancialData.company_id.in_(company_ids))\
+                            .one() if company_ids else None
+    return tuple(positions), tuple(marks_stamp) if marks_stamp else None, store.version if store else None
+
+class NavCache:
+    """
+    Per-worker cache of closed NAV points, least recently used funds evicted first.
+    Each fund's points are dropped as soon as its stamp (investments and marks) changes.
+    """
+
+    def __init__(self, max_funds=MAX_NAV_CACHE_FUNDS, max_points=MAX_NAV_CACHE_POINTS):
+        self.max_funds = max_funds
+        self.max_points = max_points
+        self._lock = threading.Lock()
+        self._funds = OrderedDict()  # fund_id -> (stamp, OrderedDict of date -> point)
+
+    def get(self, fund_id, stamp, dates):
+        """Returns the cached points among `dates` for the fund, if its stamp still matches."""
+        with self._lock:
+            cached_stamp, points = self._funds.get(fund_id, (None, None))
+            if cached_stamp != stamp:
+                return {}
+            self._funds.move_to_end(fund_id)
+            return {d: points[d] for d in dates if d in points}
+
+    def put(self, fund_id, stamp, new_points):
+        with self._lock:
+            cached_stamp, points = self._funds.get(fund_id, (None, None))
+            if cached_stamp != stamp:
+                points = OrderedDict()
+                self._funds[fund_id] = (stamp, points)
+            self._funds.move_to_end(fund_id)
+            points.update(new_points)
+            while len(points) > self.max_points:
+                points.popitem(last=False)
+            while len(self._funds) > self.max_funds:
+                self._funds.popitem(last=False)
+
+def get_nav_cache():
+    cache = current_app.extensions.get('nav_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('nav_cache', NavCache())
+    return cache
+
+def calculate_nav_series(fund_id: int, start: date, end: date, freq: str = 'M') -> list:
     """
-    Retrieves key performance metrics for a specific fund.
-    ---
-    get:
-      summary: Get fund performance metrics
-      parameters:
-        - in: path
-          name: fund_id
-          schema:
-            type: integer
-          required: true
-          description: ID of the fund
-      responses:
-        200:
-          description: Fund metrics
-          content:
-            application/json:
-              schema:
-                type: object
-                properties:
-                  tvpi:
-                    type: number
-                  dpi:
-                    type: number
-                  rvpi:
-                    type: number
-                  # ... other metrics
-        404:
-          description: Fund not found
+    Calculates the fund's NAV, paid-in capital, distributions and TVPI at the end of every period
+    between `start` and `end`. Closed periods (those ending before today) are cached per worker
+    until the fund's investments, marks or prices change. Public companies in the price store are
+    valued at market; everything else at its latest valuation mark.
+    Exits with an exit amount but no exit date can't be placed in time, so they only count as
+    distributions in the last point, which keeps that point in line with the fund's DPI.
     """
-    fund = Fund.query.get_or_404(fund_id)
-    metrics = {
-        "tvpi": calculate_tvpi(fund.id),
-        "dpi": calculate_dpi(fund.id),
-        "rvpi": calculate_rvpi(fund.id),
-        # Add more metrics here
+    snapshot = get_portfolio_snapshot()
+    positions = snapshot.fund_positions(fund_id)
+    dates = nav_dates(start, end, freq)
+    store = get_price_store()
+    public = load_public_positions(snapshot, store, [fund_id]) if store and positions else None
+
+    cache = get_nav_cache()
+    stamp = _nav_cache_stamp(positions, store if public is not None and len(public) else None)
+    points = cache.get(fund_id, stamp, dates)
+    missing = [d for d in dates if d not in points]
+    if missing:
+        paid_in, distributions, nav = _nav_points(positions, [d.toordinal() for d in missing], store, public)
+        for i, d in enumerate(missing):
+            points[d] = _nav_point(d, paid_in[i], distributions[i], nav[i])
+        today = date.today()
+        cache.put(fund_id, stamp, {d: points[d] for d in missing if d < today})
+
+    series = [points[d] for d in dates]
+    undated_exits = sum(position[6] for position in positions if position[5] == NO_DATE)
+    if undated_exits:
+        last = series[-1]
+        series[-1] = _nav_point(end, last['paid_in'], last['distributions'] + undated_exits, last['nav'])
+    return series
+
+def _nav_point(d, paid_in, distributions, nav):
+    tvpi = (distributions + nav) / paid_in if paid_in else 0.0
+    return {
+        "date": d.isoformat(),
+        "nav": round(float(nav), 2),
+        "paid_in": round(float(paid_in), 2),
+        "distributions": round(float(distributions), 2),
+        "tvpi": round(float(tvpi), 4),
     }
-    return jsonify(metrics), 200
\ No newline at end of file
+
+# TODO: Implement more complex calculations like IRR (requires a more sophisticated library or custom algo)
+# You'd need to use a financial library like numpy_financial for XIRR/IRR.
+# pip install numpy-financial
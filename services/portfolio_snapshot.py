@@ -0,0 +1,302 @@
+import math
+import threading
+import time
+from array import array
+from datetime import timedelta
+
+from flask import current_app
+from models import Investment, FinancialData
+from extensions import db
+
+# Re-read rows updated this long before the watermark on each refresh, so rows written by
+# transactions that committed late (with an older updated_at) are still picked up.
+# Upserts are idempotent, so re-reading a row is harmless.
+REFRESH_OVERLAP = timedelta(seconds=30)
+
+INVESTMENT_COLUMNS = (
+    Investment.id, Investment.fund_id, Investment.company_id, Investment.investment_date,
+    Investment.amount_invested, Investment.equity_percentage, Investment.exit_date,
+    Investment.exit_amount, Investment.status, Investment.updated_at,
+)
+MARK_COLUMNS = (
+    FinancialData.id, FinancialData.company_id, FinancialData.data_date,
+    FinancialData.valuation, FinancialData.updated_at,
+)
+
+NO_DATE = 0  # Ordinal stored for missing dates (real ordinals start at 1)
+
+
+def _float(value):
+    return float(value) if value is not None else 0.0
+
+
+# Row indexes map a key to a bare row number while it has a single row (the common case
+# for companies) and only grow an array once a second row arrives.
+def _index_add(index, key, row):
+    rows = index.get(key)
+    if rows is None:
+        index[key] = row
+    elif isinstance(rows, int):
+        index[key] = array('l', (rows, row))
+    else:
+        rows.append(row)
+
+
+def _index_remove(index, key, row):
+    rows = index.get(key)
+    if isinstance(rows, int):
+        del index[key]
+    elif rows is not None:
+        rows.remove(row)
+
+
+def _index_rows(index, key):
+    rows = index.get(key, ())
+    return (rows,) if isinstance(rows, int) else rows
+
+
+class PortfolioSnapshot:
+    """
+    Compact, read-only in-memory copy of every investment and each company's latest mark.
+    Columns are typed arrays indexed by row, with row indexes per fund and per company,
+    so the metrics never have to materialize ORM objects.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()  # Guards the columns and indexes
+        self._refresh_lock = threading.Lock()  # Held by the one caller currently refreshing
+        self.version = 0  # Bumped whenever a refresh changes anything
+        self._refreshed_at = 0.0
+        self._reset()
+
+    def _reset(self):
+        self._watermark = None
+
+        # Investment columns, one entry per row
+        self.investment_ids = array('q')
+        self.fund_ids = array('q')
+        self.company_ids = array('q')
+        self.investment_dates = array('l')  # date ordinals
+        self.amount_invested = array('d')
+        self.equity_percentage = array('d')
+        self.exit_dates = array('l')  # date ordinals, NO_DATE if not exited
+        self.exit_amounts = array('d')
+        self.is_active = array('b')
+        self._row_by_investment = {}
+        self._rows_by_fund = {}
+        self._rows_by_company = {}
+
+        # Latest mark per company, one entry per company slot
+        self._mark_slot_by_company = {}
+        self.mark_ids = array('q')
+        self.mark_dates = array('l')
+        self.mark_valuations = array('d')  # NaN when the latest mark has no valuation
+
+    def __len__(self):
+        return len(self.investment_ids)
+
+    def refresh(self, min_interval=0.0):
+        """
+        Pulls investments and marks updated since the last refresh (everything on the first call).
+        While another caller is refreshing, returns False straight away rather than queueing behind its
+        queries; the first load is the exception, since there's nothing to read until it's done.
+        Deleted rows aren't visible through `updated_at`; call `rebuild` after deleting.
+        """
+        if min_interval and time.monotonic() - self._refreshed_at < min_interval:
+            return False
+        if not self._refresh_lock.acquire(blocking=not self._refreshed_at):
+            return False
+        try:
+            return self._refresh()
+        finally:
+            self._refresh_lock.release()
+
+    def rebuild(self):
+        with self._refresh_lock:
+            self._refresh(reset=True)
+
+    def _refresh(self, reset=False):
+        if reset or self._watermark is None:
+            # Full load: stream the rows straight into the columns
+            investments, marks = self._queries(None)
+            with self._lock:
+                if reset:
+                    self._reset()
+                    self.version += 1
+                changed = self._load(investments.yield_per(10000), marks.yield_per(10000))
+        else:
+            # Deltas are small; run them before taking the lock so readers never wait on the database
+            investments, marks = (query.all() for query in self._queries(self._watermark - REFRESH_OVERLAP))
+            with self._lock:
+                changed = self._load(investments, marks)
+        self._refreshed_at = time.monotonic()
+        return changed
+
+    @staticmethod
+    def _queries(since):
+        investments = db.session.query(*INVESTMENT_COLUMNS)
+        marks = db.session.query(*MARK_COLUMNS).order_by(FinancialData.data_date)
+        if since is not None:
+            investments = investments.filter(Investment.updated_at >= since)
+            marks = marks.filter(FinancialData.updated_at >= since)
+        return investments, marks
+
+    def load_rows(self, investment_rows, mark_rows):
+        """Loads rows shaped like INVESTMENT_COLUMNS / MARK_COLUMNS (marks in data_date order)."""
+        with self._lock:
+            return self._load(investment_rows, mark_rows)
+
+    def _load(self, investment_rows, mark_rows):
+        changed = False
+        stale_companies = set()
+        for row in investment_rows:
+            changed |= self._apply_investment(row)
+            self._advance_watermark(row[-1])
+        for row in mark_rows:
+            applied, stale = self._apply_mark(row)
+            changed |= applied
+            if stale:
+                stale_companies.add(row[1])
+            self._advance_watermark(row[-1])
+        for company_id in stale_companies:
+            self._reload_latest_mark(company_id)
+            changed = True
+        if changed:
+            self.version += 1
+        return changed
+
+    def _advance_watermark(self, updated_at):
+        if updated_at is not None and (self._watermark is None or updated_at > self._watermark):
+            self._watermark = updated_at
+
+    def _apply_investment(self, row):
+        (investment_id, fund_id, company_id, investment_date, amount_invested,
+         equity_percentage, exit_date, exit_amount, status, _updated_at) = row
+        values = (
+            investment_date.toordinal() if investment_date else NO_DATE,
+            _float(amount_invested),
+            _float(equity_percentage),
+            exit_date.toordinal() if exit_date else NO_DATE,
+            _float(exit_amount),
+            1 if status == 'Active' else 0,
+        )
+        i = self._row_by_investment.get(investment_id)
+        if i is None:
+            i = len(self.investment_ids)
+            self._row_by_investment[investment_id] = i
+            self.investment_ids.append(investment_id)
+            self.fund_ids.append(fund_id)
+            self.company_ids.append(company_id)
+            _index_add(self._rows_by_fund, fund_id, i)
+            _index_add(self._rows_by_company, company_id, i)
+            for column, value in zip(self._value_columns(), values):
+                column.append(value)
+            return True
+
+        columns = self._value_columns()
+        if (self.fund_ids[i] == fund_id and self.company_ids[i] == company_id
+                and all(column[i] == value for column, value in zip(columns, values))):
+            return False
+        if self.fund_ids[i] != fund_id:
+            _index_remove(self._rows_by_fund, self.fund_ids[i], i)
+            _index_add(self._rows_by_fund, fund_id, i)
+            self.fund_ids[i] = fund_id
+        if self.company_ids[i] != company_id:
+            _index_remove(self._rows_by_company, self.company_ids[i], i)
+            _index_add(self._rows_by_company, company_id, i)
+            self.company_ids[i] = company_id
+        for column, value in zip(columns, values):
+            column[i] = value
+        return True
+
+    def _value_columns(self):
+        return (self.investment_dates, self.amount_invested, self.equity_percentage,
+                self.exit_dates, self.exit_amounts, self.is_active)
+
+    def _apply_mark(self, row):
+        """Returns (applied, stale): stale means the current latest mark moved back in time."""
+        mark_id, company_id, data_date, valuation, _updated_at = row
+        ordinal = data_date.toordinal()
+        valuation = float(valuation) if valuation is not None else math.nan
+        slot = self._mark_slot_by_company.get(company_id)
+        if slot is None:
+            self._mark_slot_by_company[company_id] = len(self.mark_ids)
+            self.mark_ids.append(mark_id)
+            self.mark_dates.append(ordinal)
+            self.mark_valuations.append(valuation)
+            return True, False
+        if self.mark_ids[slot] == mark_id:
+            current = self.mark_valuations[slot]
+            same_valuation = current == valuation or (math.isnan(current) and math.isnan(valuation))
+            if ordinal == self.mark_dates[slot] and same_valuation:
+                return False, False
+            stale = ordinal < self.mark_dates[slot]
+            self.mark_dates[slot] = ordinal
+            self.mark_valuations[slot] = valuation
+            return True, stale
+        if ordinal >= self.mark_dates[slot]:
+            self.mark_ids[slot] = mark_id
+            self.mark_dates[slot] = ordinal
+            self.mark_valuations[slot] = valuation
+            return True, False
+        return False, False
+
+    def _reload_latest_mark(self, company_id):
+        latest = db.session.query(*MARK_COLUMNS).filter(FinancialData.company_id == company_id)\
+                                                .order_by(FinancialData.data_date.desc())\
+                                                .first()
+        slot = self._mark_slot_by_company[company_id]
+        self.mark_ids[slot] = latest[0]
+        self.mark_dates[slot] = latest[2].toordinal()
+        self.mark_valuations[slot] = float(latest[3]) if latest[3] is not None else math.nan
+
+    def fund_rows(self, fund_id):
+        return _index_rows(self._rows_by_fund, fund_id)
+
+    def company_rows(self, company_id):
+        return _index_rows(self._rows_by_company, company_id)
+
+    def latest_valuation(self, company_id):
+        """Latest mark's valuation for a company, or None if it has no marks or no valuation."""
+        slot = self._mark_slot_by_company.get(company_id)
+        if slot is None or math.isnan(self.mark_valuations[slot]):
+            return None
+        return self.mark_valuations[slot]
+
+    def current_valuation(self, row):
+        """Same rules as fund_calculations.get_current_investment_valuation, for a snapshot row."""
+        valuation = self.latest_valuation(self.company_ids[row])
+        if valuation:
+            return valuation * self.equity_percentage[row] / 100
+        return self.exit_amounts[row]
+
+    def fund_positions(self, fund_id):
+        """
+        Returns a fund's investments as (row, company_id, investment_date, amount_invested, equity_percentage,
+        exit_date, exit_amount, is_active) tuples, with dates as ordinals.
+        """
+        with self._lock:
+            return [(i, self.company_ids[i], self.investment_dates[i], self.amount_invested[i],
+                     self.equity_percentage[i], self.exit_dates[i], self.exit_amounts[i], self.is_active[i])
+                    for i in self.fund_rows(fund_id)]
+
+    def fund_totals(self, fund_id):
+        """Returns (paid_in, distributions, remaining_value) for a fund."""
+        with self._lock:
+            rows = self.fund_rows(fund_id)
+            paid_in = sum(self.amount_invested[i] for i in rows)
+            distributions = sum(self.exit_amounts[i] for i in rows)
+            remaining = sum(self.current_valuation(i) for i in rows if self.is_active[i])
+            return paid_in, distributions, remaining
+
+
+def get_portfolio_snapshot():
+    """
+    Returns this worker's snapshot for the current app, refreshed with any changes since the last call.
+    PORTFOLIO_SNAPSHOT_REFRESH_SECONDS throttles the refresh (0 = check on every call).
+    """
+    snapshot = current_app.extensions.get('portfolio_snapshot')
+    if snapshot is None:
+        snapshot = current_app.extensions.setdefault('portfolio_snapshot', PortfolioSnapshot())
+    snapshot.refresh(current_app.config.get('PORTFOLIO_SNAPSHOT_REFRESH_SECONDS', 0.0))
+    return snapshot
@@ -0,0 +1,315 @@
+import argparse
+import csv
+import json
+import os
+import re
+import shutil
+import time
+from array import array
+from datetime import date, datetime
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import func
+from models import Company, FinancialData
+from extensions import db
+from services.portfolio_snapshot import NO_DATE
+
+PRICES_FILE = 'prices.npy'
+DATES_FILE = 'dates.npy'
+TICKERS_FILE = 'tickers.json'
+# Names the version directory readers should open; imports switch it with a single os.replace
+CURRENT_FILE = 'CURRENT'
+VERSION_RE = re.compile(r'^v[0-9]{20}$')
+
+# Column names accepted for each field in price files
+DATE_COLUMNS = ('date', 'data_date')
+TICKER_COLUMNS = ('ticker', 'ticker_symbol', 'symbol')
+PRICE_COLUMNS = ('close', 'stock_price', 'price', 'adj_close')
+
+# A price older than this many trading days is too stale to mark with
+MAX_STALE_ROWS = 10
+# The same limit in calendar days, for dates past the end of the store
+MAX_STALE_DAYS = 14
+
+
+class PriceStore:
+    """
+    Daily closing prices for many tickers, memory-mapped from the current version under `directory`.
+    Prices are a (trading date x ticker) float64 matrix with NaN where a ticker has no close.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.version = current_version(directory)
+        if self.version is None:
+            raise FileNotFoundError(f"{directory}: no price store has been imported")
+        path = os.path.join(directory, self.version)
+        self.dates = np.load(os.path.join(path, DATES_FILE))  # Sorted date ordinals (int32)
+        self.prices = np.load(os.path.join(path, PRICES_FILE), mmap_mode='r')
+        with open(os.path.join(path, TICKERS_FILE)) as f:
+            self.tickers = json.load(f)
+        if self.prices.shape != (len(self.dates), len(self.tickers)):
+            raise ValueError(f"{path}: prices are {self.prices.shape}, expected "
+                             f"{len(self.dates)} dates x {len(self.tickers)} tickers")
+        self.ticker_index = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+    @classmethod
+    def exists(cls, directory):
+        return current_version(directory) is not None
+
+    def asof_rows(self, ordinals):
+        """Row of the last trading date on or before each ordinal (-1 if before the first)."""
+        return np.searchsorted(self.dates, ordinals, side='right') - 1
+
+    def asof_prices(self, start_row, end_row, columns=None, max_stale_rows=MAX_STALE_ROWS):
+        """
+        Prices for rows [start_row, end_row] (and only `columns`, if given), each ticker forward-filled
+        from its last close, looking back at most `max_stale_rows` trading days.
+        NaN where there is no usable close.
+        """
+        lookback_row = max(0, start_row - max_stale_rows)
+        window = self.prices[lookback_row:end_row + 1]
+        window = np.asarray(window[:, columns] if columns is not None else window)
+        valid = ~np.isnan(window)
+        row_numbers = np.arange(len(window))[:, None]
+        last_valid = np.maximum.accumulate(np.where(valid, row_numbers, -1), axis=0)
+        filled = window[np.maximum(last_valid, 0), np.arange(window.shape[1])]
+        stale = (last_valid < 0) | (row_numbers - last_valid > max_stale_rows)
+        filled[stale] = np.nan
+        return filled[start_row - lookback_row:]
+
+    def price_on(self, ticker, on_date, max_stale_rows=MAX_STALE_ROWS):
+        column = self.ticker_index.get(ticker)
+        row = int(self.asof_rows(on_date.toordinal()))
+        if column is None or row < 0:
+            return None
+        price = self.asof_prices(row, row, [column], max_stale_rows)[0, 0]
+        return None if np.isnan(price) else float(price)
+
+
+def current_version(directory):
+    """Name of the version directory the store currently points at, or None if nothing was imported."""
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return version if VERSION_RE.match(version) else None
+
+
+def _pick_column(fieldnames, candidates, path):
+    lowered = {name.strip().lower(): name for name in fieldnames or ()}
+    for candidate in candidates:
+        if candidate in lowered:
+            return lowered[candidate]
+    raise ValueError(f"{path}: expected one of {', '.join(candidates)} columns")
+
+
+def _read_price_file(path, ticker_index, ordinals, columns, prices):
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        date_col = _pick_column(reader.fieldnames, DATE_COLUMNS, path)
+        ticker_col = _pick_column(reader.fieldnames, TICKER_COLUMNS, path)
+        price_col = _pick_column(reader.fieldnames, PRICE_COLUMNS, path)
+        for row in reader:
+            price = row[price_col]
+            if not price:
+                continue
+            ticker = row[ticker_col].strip().upper()
+            ordinals.append(datetime.strptime(row[date_col][:10], '%Y-%m-%d').toordinal())
+            columns.append(ticker_index.setdefault(ticker, len(ticker_index)))
+            prices.append(float(price))
+
+
+def import_price_files(paths, directory):
+    """
+    Loads CSV price files (date, ticker, close) into the store at `directory`, merging with
+    whatever is already there; imported closes overwrite existing ones for the same date and ticker.
+    Each import is written to a new version directory and published by atomically replacing the
+    CURRENT pointer, so readers see either the old store or the new one, never a mix.
+    The previous version is kept for readers still opening it; older ones are removed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    existing = PriceStore(directory) if PriceStore.exists(directory) else None
+    ticker_index = dict(existing.ticker_index) if existing else {}
+
+    ordinals, columns, prices = array('q'), array('q'), array('d')
+    for path in paths:
+        _read_price_file(path, ticker_index, ordinals, columns, prices)
+    ordinals = np.frombuffer(ordinals, dtype=np.int64) if ordinals else np.empty(0, np.int64)
+    columns = np.frombuffer(columns, dtype=np.int64) if columns else np.empty(0, np.int64)
+    prices = np.frombuffer(prices, dtype=np.float64) if prices else np.empty(0, np.float64)
+
+    dates = np.union1d(existing.dates if existing else np.empty(0, np.int32), ordinals).astype(np.int32)
+    tickers = sorted(ticker_index, key=ticker_index.get)
+
+    version = f"v{time.time_ns():020d}"
+    path = os.path.join(directory, version)
+    os.makedirs(path)
+    matrix = np.lib.format.open_memmap(os.path.join(path, PRICES_FILE), mode='w+', dtype=np.float64,
+                                       shape=(len(dates), len(tickers)))
+    matrix[:] = np.nan
+    if existing:
+        old_rows = np.searchsorted(dates, existing.dates)
+        matrix[old_rows, :len(existing.tickers)] = existing.prices
+    matrix[np.searchsorted(dates, ordinals), columns] = prices
+    matrix.flush()
+    np.save(os.path.join(path, DATES_FILE), dates)
+    with open(os.path.join(path, TICKERS_FILE), 'w') as f:
+        json.dump(tickers, f)
+    previous = existing.version if existing else None
+    del matrix, existing
+
+    tmp_pointer = os.path.join(directory, CURRENT_FILE + '.tmp')
+    with open(tmp_pointer, 'w') as f:
+        f.write(version)
+    os.replace(tmp_pointer, os.path.join(directory, CURRENT_FILE))
+
+    for name in os.listdir(directory):
+        if VERSION_RE.match(name) and name not in (version, previous):
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    return len(prices)
+
+
+def get_price_store():
+    """Returns the app's price store (reopened after a new import), or None if nothing was imported."""
+    directory = current_app.config.get('PRICE_STORE_DIR') or os.path.join(current_app.instance_path, 'price_store')
+    version = current_version(directory)
+    if version is None:
+        return None
+    store = current_app.extensions.get('price_store')
+    if store is None or store.directory != directory or store.version != version:
+        store = PriceStore(directory)
+        current_app.extensions['price_store'] = store
+    return store
+
+
+class PublicPositions:
+    """Public-company positions as parallel numpy arrays, sorted by fund."""
+
+    def __init__(self, fund_ids, columns, shares, start_ordinals, end_ordinals, rows=None):
+        order = np.argsort(fund_ids, kind='stable')
+        # Portfolio snapshot row of each position, when built from a snapshot
+        self.rows = np.asarray(rows if rows is not None else np.full(len(order), -1), dtype=np.int64)[order]
+        self.fund_ids = np.asarray(fund_ids, dtype=np.int64)[order]
+        self.columns = np.asarray(columns, dtype=np.int64)[order]  # Ticker column in the price store
+        self.shares = np.asarray(shares, dtype=np.float64)[order]
+        self.start_ordinals = np.asarray(start_ordinals, dtype=np.int64)[order]
+        self.end_ordinals = np.asarray(end_ordinals, dtype=np.int64)[order]  # Exclusive
+
+    def __len__(self):
+        return len(self.fund_ids)
+
+
+def _implied_shares_outstanding(company_ids):
+    """Shares outstanding implied by each company's latest mark with both a valuation and a stock price."""
+    has_both = (FinancialData.valuation.isnot(None), FinancialData.stock_price.isnot(None), FinancialData.stock_price > 0)
+    latest = db.session.query(FinancialData.company_id, func.max(FinancialData.data_date).label('data_date'))\
+                       .filter(FinancialData.company_id.in_(company_ids), *has_both)\
+                       .group_by(FinancialData.company_id)\
+                       .subquery()
+    rows = db.session.query(FinancialData.company_id, FinancialData.valuation, FinancialData.stock_price)\
+                     .join(latest, (FinancialData.company_id == latest.c.company_id) &
+                                   (FinancialData.data_date == latest.c.data_date))
+    return {company_id: float(valuation) / float(stock_price) for company_id, valuation, stock_price in rows}
+
+
+def load_public_positions(snapshot, store, fund_ids=None):
+    """
+    Builds the public positions to mark from the portfolio snapshot, for every fund or just `fund_ids`.
+    Shares held are `equity_percentage` of the shares outstanding implied by the company's latest
+    valuation / stock_price mark; without one, they're the cost basis over the close on the investment date.
+    Positions whose ticker isn't in the store, or that can't be sized, are skipped.
+    """
+    public = db.session.query(Company.id, Company.ticker_symbol)\
+                       .filter(Company.is_public.is_(True), Company.ticker_symbol.isnot(None))
+    in_scope = None
+    if fund_ids is not None:
+        in_scope = {i for fund_id in fund_ids for i in snapshot.fund_rows(fund_id)}
+        public = public.filter(Company.id.in_(list({snapshot.company_ids[i] for i in in_scope})))
+    tickers = {company_id: store.ticker_index.get(symbol.strip().upper()) for company_id, symbol in public}
+    tickers = {company_id: column for company_id, column in tickers.items() if column is not None}
+    shares_outstanding = _implied_shares_outstanding(list(tickers)) if tickers else {}
+
+    fund_ids, columns, shares, starts, ends, rows = [], [], [], [], [], []
+    for company_id, column in tickers.items():
+        for i in snapshot.company_rows(company_id):
+            if in_scope is not None and i not in in_scope:
+                continue
+            start = snapshot.investment_dates[i]
+            if snapshot.exit_dates[i] != NO_DATE:
+                end = snapshot.exit_dates[i]
+            elif snapshot.is_active[i]:
+                end = date.max.toordinal() + 1
+            else:
+                continue  # Written off without a date; can't tell when it stopped being held
+            if company_id in shares_outstanding:
+                held = shares_outstanding[company_id] * snapshot.equity_percentage[i] / 100
+            else:
+                entry_price = store.price_on(store.tickers[column], date.fromordinal(start))
+                if not entry_price:
+                    continue
+                held = snapshot.amount_invested[i] / entry_price
+            fund_ids.append(snapshot.fund_ids[i])
+            columns.append(column)
+            shares.append(held)
+            starts.append(start)
+            ends.append(end)
+            rows.append(i)
+    return PublicPositions(fund_ids, columns, shares, starts, ends, rows)
+
+
+def position_prices(store, positions, ordinals, max_stale_rows=MAX_STALE_ROWS):
+    """
+    Each position's price as of every date in `ordinals`, as a (dates x positions) array: the last close
+    on or before the date. NaN where that position's ticker has no close within `max_stale_rows` trading
+    days, or the date is more than MAX_STALE_DAYS past the store's last trading date before it.
+    Unlike mark_to_market, holding periods aren't applied.
+    """
+    targets = np.asarray(ordinals, dtype=np.int64)
+    rows = store.asof_rows(targets)
+    prices = np.full((len(targets), len(positions)), np.nan)
+    traded = rows >= 0
+    if traded.any() and len(positions):
+        first_row = int(rows[traded].min())
+        window = store.asof_prices(first_row, int(rows.max()), positions.columns, max_stale_rows)
+        prices[traded] = window[rows[traded] - first_row]
+        prices[targets - store.dates[np.maximum(rows, 0)] > MAX_STALE_DAYS] = np.nan
+    return prices
+
+
+def mark_to_market(store, positions, start, end, chunk_rows=256):
+    """
+    Values every public position on every trading date in [start, end] in one vectorized pass.
+    Returns (dates, fund_ids, values) where values[d, f] is fund f's public holdings value on dates[d].
+    Positions are valued from the investment date up to (not including) the exit date.
+    """
+    first_row = int(np.searchsorted(store.dates, start.toordinal(), side='left'))
+    last_row = int(store.asof_rows(end.toordinal()))
+    funds = np.unique(positions.fund_ids)
+    if last_row < first_row or not len(positions):
+        return [], funds.tolist(), np.zeros((0, len(funds)))
+
+    dates = store.dates[first_row:last_row + 1]
+    # Positions are sorted by fund, so each fund's positions are one contiguous block
+    boundaries = np.flatnonzero(np.r_[True, positions.fund_ids[1:] != positions.fund_ids[:-1]])
+    fund_values = np.empty((len(dates), len(funds)))
+    # Work through the dates in blocks so the (dates x positions) intermediates stay bounded
+    for block_start in range(first_row, last_row + 1, chunk_rows):
+        block_end = min(block_start + chunk_rows, last_row + 1) - 1
+        block_dates = store.dates[block_start:block_end + 1, None]
+        prices = store.asof_prices(block_start, block_end, positions.columns)  # dates x positions
+        held = (block_dates >= positions.start_ordinals) & (block_dates < positions.end_ordinals)
+        values = np.where(held & ~np.isnan(prices), prices * positions.shares, 0.0)
+        fund_values[block_start - first_row:block_end - first_row + 1] = np.add.reduceat(values, boundaries, axis=1)
+    return [date.fromordinal(int(d)) for d in dates], funds.tolist(), fund_values
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import daily price files into the memory-mapped price store.")
+    parser.add_argument('files', nargs='+', help="CSV files with date, ticker and close columns")
+    parser.add_argument('--store', default=os.environ.get('PRICE_STORE_DIR') or 'instance/price_store',
+                        help="Price store directory")
+    args = parser.parse_args()
+    print(f"Imported {import_price_files(args.files, args.store)} prices into {args.store}")
@@ -0,0 +1,200 @@
+import cProfile
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from functools import wraps
+
+from flask import Blueprint, current_app, g, jsonify, request, send_from_directory
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+# Admin endpoints for listing and downloading captures. Only registered when profiling is enabled.
+profiling_bp = Blueprint('profiling', __name__)
+
+CAPTURE_ID_RE = re.compile(r'^[0-9]{20}-[0-9a-f]{8}$')
+
+
+def init_request_profiler(app):
+    """
+    Wires per-request profiling into the app when PROFILING_ENABLED is set.
+    When it isn't, nothing is registered, so requests pay no profiling overhead at all.
+    """
+    if not app.config.get('PROFILING_ENABLED'):
+        return
+
+    app.extensions['request_profiler'] = ProfileStore(
+        app.config.get('PROFILING_DIR') or os.path.join(app.instance_path, 'profiles'),
+        app.config.get('PROFILING_MAX_CAPTURES', 50),
+    )
+    app.before_request(_start_profiling)
+    app.after_request(_finish_profiling)
+    app.teardown_request(_abort_profiling)
+    app.register_blueprint(profiling_bp, url_prefix='/api/admin')
+
+
+class ProfileStore:
+    """Bounded on-disk ring buffer of cProfile captures: the oldest capture is evicted once full."""
+
+    def __init__(self, directory, max_captures):
+        self.directory = os.path.abspath(directory)
+        self.max_captures = max(1, int(max_captures))
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def save(self, profiler, meta):
+        # Capture ids sort by time, which is what eviction relies on
+        capture_id = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        meta = dict(meta, id=capture_id)
+        profiler.dump_stats(os.path.join(self.directory, f"{capture_id}.prof"))
+        with open(os.path.join(self.directory, f"{capture_id}.json"), 'w') as f:
+            json.dump(meta, f)
+        self._evict()
+        return meta
+
+    def list(self):
+        captures = []
+        for capture_id in reversed(self._capture_ids()):
+            try:
+                with open(os.path.join(self.directory, f"{capture_id}.json")) as f:
+                    captures.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # Evicted or half-written by another worker
+        return captures
+
+    def _capture_ids(self):
+        return sorted(name[:-len('.json')] for name in os.listdir(self.directory)
+                      if name.endswith('.json') and CAPTURE_ID_RE.match(name[:-len('.json')]))
+
+    def _evict(self):
+        with self._lock:
+            capture_ids = self._capture_ids()
+            for capture_id in capture_ids[:max(0, len(capture_ids) - self.max_captures)]:
+                for ext in ('.json', '.prof'):
+                    try:
+                        os.remove(os.path.join(self.directory, capture_id + ext))
+                    except FileNotFoundError:
+                        pass
+
+
+def _is_profiling_admin(identity):
+    """Only JWT identities listed in PROFILING_ADMINS may trigger profiles or read captures."""
+    admins = {str(admin) for admin in current_app.config.get('PROFILING_ADMINS', ())}
+    return identity is not None and str(identity) in admins
+
+
+def _admin_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        verify_jwt_in_request()
+        if not _is_profiling_admin(get_jwt_identity()):
+            return jsonify({"error": "Profiling admins only."}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _profile_trigger():
+    """Returns why this request should be profiled, or None if it shouldn't be."""
+    if request.blueprint == profiling_bp.name:
+        return None  # Never profile the capture endpoints themselves
+    header = current_app.config.get('PROFILING_HEADER', 'X-Profile-Request')
+    if request.headers.get(header):
+        # Only honour the header from profiling admins
+        try:
+            verify_jwt_in_request(optional=True)
+            if _is_profiling_admin(get_jwt_identity()):
+                return 'header'
+        except Exception:
+            pass
+    sample_rate = current_app.config.get('PROFILING_SAMPLE_RATE', 0.0)
+    if sample_rate and random.random() < sample_rate:
+        return 'sampled'
+    return None
+
+
+def _start_profiling():
+    trigger = _profile_trigger()
+    if trigger is None:
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active (Python 3.12+ allows one per process); skip this request
+        return
+    g._request_profiler = (profiler, trigger, time.perf_counter())
+
+
+def _finish_profiling(response):
+    state = g.pop('_request_profiler', None)
+    if state is None:
+        return response
+    profiler, trigger, start = state
+    profiler.disable()
+    try:
+        meta = current_app.extensions['request_profiler'].save(profiler, {
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status_code": response.status_code,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+            "trigger": trigger,
+            "captured_at": datetime.utcnow().isoformat(),
+        })
+    except OSError:
+        # A failed capture (disk full, permissions) mustn't fail the request it was profiling
+        current_app.logger.exception("Could not save request profile for %s %s", request.method, request.path)
+        return response
+    response.headers['X-Profile-Id'] = meta['id']
+    return response
+
+
+def _abort_profiling(exc):
+    # after_request doesn't run when the view raises; make sure the profiler is switched off
+    state = g.pop('_request_profiler', None)
+    if state is not None:
+        state[0].disable()
+
+
+@profiling_bp.route('/profiles', methods=['GET'])
+@_admin_required
+def list_profiles():
+    """
+    Lists captured request profiles, newest first.
+    ---
+    get:
+      summary: List request profiles
+      responses:
+        200:
+          description: Profile captures with request metadata
+    """
+    return jsonify(current_app.extensions['request_profiler'].list()), 200
+
+
+@profiling_bp.route('/profiles/<capture_id>', methods=['GET'])
+@_admin_required
+def download_profile(capture_id):
+    """
+    Downloads a capture as a pstats file (load with `python -m pstats` or snakeviz).
+    ---
+    get:
+      summary: Download a request profile
+      parameters:
+        - in: path
+          name: capture_id
+          schema:
+            type: string
+          required: true
+      responses:
+        200:
+          description: pstats file
+        404:
+          description: Profile not found
+    """
+    if not CAPTURE_ID_RE.match(capture_id):
+        return jsonify({"error": "Profile not found."}), 404
+    store = current_app.extensions['request_profiler']
+    return send_from_directory(store.directory, f"{capture_id}.prof", as_attachment=True)
@@ -0,0 +1,325 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from itertools import islice
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from models import Company, Fund
+from extensions import db
+from services.portfolio_snapshot import REFRESH_OVERLAP
+
+SEARCH_TYPES = ('company', 'fund')
+
+# Fields indexed per entity type, best first; earlier fields rank higher on equal match quality
+SEARCH_FIELDS = {
+    'company': ('name', 'ticker_symbol', 'industry'),
+    'fund': ('name',),
+}
+
+# Match quality, best first
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING = range(4)
+
+# Most prefix entries scanned per tier, so very short prefixes stay fast on large indexes
+MAX_PREFIX_SCAN = 2000
+# Most substring candidates checked per query. Substring matches only fill whatever the prefix
+# tiers left over, so for very broad queries they're a best-effort sample rather than the full set.
+MAX_SUBSTRING_SCAN = 1000
+
+NGRAM = 3
+
+
+def _normalize(value):
+    return ' '.join(str(value).lower().split()) if value else ''
+
+
+def _ngrams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class SearchIndex:
+    """
+    In-memory typeahead index over company and fund names, tickers and industries.
+    Sorted term lists, one per (whole field or word, field) tier, answer prefix queries with bisect
+    and stop after `limit` hits; a trigram index narrows substring queries to a few candidates.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.entities = {}  # (type, id) -> result dict
+        self._fields = {}  # (type, id) -> [(field_rank, normalized value)]
+        # (is_word, field_rank) -> sorted [(term, type, id)], in ranking order
+        max_fields = max(len(fields) for fields in SEARCH_FIELDS.values())
+        self._terms = {(is_word, rank): [] for is_word in (False, True) for rank in range(max_fields)}
+        self._ngrams = {}  # trigram -> set of (type, id)
+
+    def __len__(self):
+        return len(self.entities)
+
+    def add(self, entity_type, entity_id, **values):
+        """Adds or replaces an entity, e.g. add('company', 1, name='Acme', ticker_symbol='ACME')."""
+        with self._lock:
+            current = self.entities.get((entity_type, entity_id))
+            if current is not None and all(current[field] == values.get(field) for field in SEARCH_FIELDS[entity_type]):
+                return
+            self._remove((entity_type, entity_id))
+            for tier, term in self._insert(entity_type, entity_id, values):
+                insort(self._terms[tier], term)
+
+    def load(self, entities):
+        """Bulk-adds (type, id, values) entities, sorting the term lists once at the end."""
+        with self._lock:
+            for entity_type, entity_id, values in entities:
+                self._remove((entity_type, entity_id))
+                for tier, term in self._insert(entity_type, entity_id, values):
+                    self._terms[tier].append(term)
+            for terms in self._terms.values():
+                terms.sort()
+
+    def _insert(self, entity_type, entity_id, values):
+        """Indexes an entity's fields and n-grams, returning the prefix terms still to be added."""
+        key = (entity_type, entity_id)
+        fields = [(rank, _normalize(values.get(field))) for rank, field in enumerate(SEARCH_FIELDS[entity_type])]
+        fields = [(rank, value) for rank, value in fields if value]
+        self.entities[key] = dict({field: values.get(field) for field in SEARCH_FIELDS[entity_type]},
+                                  type=entity_type, id=entity_id)
+        self._fields[key] = fields
+        for _, value in fields:
+            for ngram in _ngrams(value):
+                self._ngrams.setdefault(ngram, set()).add(key)
+        return self._entity_terms(key, fields)
+
+    def remove(self, entity_type, entity_id):
+        with self._lock:
+            self._remove((entity_type, entity_id))
+
+    def _remove(self, key):
+        fields = self._fields.pop(key, None)
+        if fields is None:
+            return
+        del self.entities[key]
+        for tier, term in self._entity_terms(key, fields):
+            terms = self._terms[tier]
+            i = bisect_left(terms, term)
+            if i < len(terms) and terms[i] == term:
+                del terms[i]
+        for _, value in fields:
+            for ngram in _ngrams(value):
+                keys = self._ngrams.get(ngram)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._ngrams[ngram]
+
+    @staticmethod
+    def _entity_terms(key, fields):
+        """(tier, term) pairs: each whole field, plus the field from each later word onwards."""
+        terms = set()
+        for rank, value in fields:
+            terms.add(((False, rank), (value,) + key))
+            words = value.split(' ')
+            for i in range(1, len(words)):
+                terms.add(((True, rank), (' '.join(words[i:]),) + key))
+        return terms
+
+    def search(self, query, limit=10, entity_type=None):
+        """
+        Returns up to `limit` entities matching `query`, best first: exact field matches, then field
+        prefixes, word prefixes and substrings; ties go to the earlier field, then alphabetical order.
+        """
+        query = _normalize(query)
+        if not query or limit <= 0:
+            return []
+        best = {}  # (type, id) -> (quality, field_rank, value)
+
+        with self._lock:
+            for (is_word, field_rank), terms in self._terms.items():
+                # A word prefix never outranks a whole-field prefix; stop once those filled the results
+                if is_word and len(best) >= limit:
+                    break
+                found = 0
+                i = bisect_left(terms, (query,))
+                for term, *key in terms[i:i + MAX_PREFIX_SCAN]:
+                    if not term.startswith(query) or found >= limit:
+                        break
+                    key = tuple(key)
+                    if entity_type is not None and key[0] != entity_type:
+                        continue
+                    quality = WORD_PREFIX if is_word else (EXACT if term == query else PREFIX)
+                    rank = (quality, field_rank, term)
+                    if key not in best or rank < best[key]:
+                        best[key] = rank
+                        found += 1
+
+            # Substring matches can't outrank prefix matches, so only look for them to fill up the results
+            if len(best) < limit and len(query) >= NGRAM:
+                candidates = None
+                for ngram in sorted(_ngrams(query), key=lambda ngram: len(self._ngrams.get(ngram, ()))):
+                    keys = self._ngrams.get(ngram, set())
+                    # Intersecting walks the smaller set, so this never copies a large posting set
+                    candidates = keys if candidates is None else candidates & keys
+                    if len(candidates) <= limit:
+                        break
+                for key in islice(candidates or (), MAX_SUBSTRING_SCAN):
+                    if key in best or (entity_type is not None and key[0] != entity_type):
+                        continue
+                    for field_rank, value in self._fields[key]:
+                        if query in value:
+                            best[key] = (SUBSTRING, field_rank, value)
+                            break
+
+            ranked = sorted(best, key=best.get)[:limit]
+            return [dict(self.entities[key], match=best[key][0]) for key in ranked]
+
+
+def _entity_rows(since=None):
+    """(type, id, values, updated_at) for every company and fund, or those updated since `since`."""
+    companies = db.session.query(Company.id, Company.name, Company.ticker_symbol, Company.industry, Company.updated_at)
+    funds = db.session.query(Fund.id, Fund.name, Fund.updated_at)
+    if since is not None:
+        companies = companies.filter(Company.updated_at >= since)
+        funds = funds.filter(Fund.updated_at >= since)
+    for company_id, name, ticker_symbol, industry, updated_at in companies.yield_per(10000):
+        yield 'company', company_id, {'name': name, 'ticker_symbol': ticker_symbol, 'industry': industry}, updated_at
+    for fund_id, name, updated_at in funds.yield_per(10000):
+        yield 'fund', fund_id, {'name': name}, updated_at
+
+
+def _latest_update():
+    latest = [db.session.query(func.max(model.updated_at)).scalar() for model in (Company, Fund)]
+    return max((updated_at for updated_at in latest if updated_at is not None), default=None)
+
+
+def build_search_index():
+    """Builds an index of every company and fund in the database."""
+    index = SearchIndex()
+    index.load((entity_type, entity_id, values) for entity_type, entity_id, values, _ in _entity_rows())
+    return index
+
+
+def refresh_search_index(index, watermark):
+    """
+    Re-indexes companies and funds updated since `watermark` (by any worker) and returns the new watermark.
+    Rows updated shortly before it are read again in case their transactions committed late.
+    Deleted rows aren't visible through `updated_at`; other workers only drop them on a restart.
+    """
+    since = watermark - REFRESH_OVERLAP if watermark is not None else None
+    for entity_type, entity_id, values, updated_at in _entity_rows(since):
+        index.add(entity_type, entity_id, **values)
+        if updated_at is not None and (watermark is None or updated_at > watermark):
+            watermark = updated_at
+    return watermark
+
+
+def get_search_index():
+    """
+    Returns the app's search index, building it from the database on first use. Writes committed in
+    this worker are applied as they commit; every SEARCH_INDEX_REFRESH_SECONDS the index also picks up
+    rows other workers updated.
+    """
+    state = current_app.extensions['search_index']
+    if state['index'] is None:
+        with state['lock']:
+            if state['index'] is None:
+                # Taken before the build, so rows written during it are picked up by the first refresh
+                state['watermark'] = _latest_update()
+                state['refreshed_at'] = time.monotonic()
+                state['index'] = build_search_index()
+        return state['index']
+
+    interval = current_app.config.get('SEARCH_INDEX_REFRESH_SECONDS', 5.0)
+    # One caller refreshes at a time; the others search the index as it stands
+    if time.monotonic() - state['refreshed_at'] >= interval and state['refresh_lock'].acquire(blocking=False):
+        try:
+            state['watermark'] = refresh_search_index(state['index'], state['watermark'])
+            state['refreshed_at'] = time.monotonic()
+        finally:
+            state['refresh_lock'].release()
+    return state['index']
+
+
+def warm_search_index(app):
+    """Builds the index ahead of the first search. If the tables don't exist yet, the first search builds it."""
+    with app.app_context():
+        try:
+            get_search_index()
+        except SQLAlchemyError as e:
+            app.logger.warning("Search index not warmed: %s", e)
+        finally:
+            db.session.remove()
+
+
+def init_search_index(app):
+    """
+    Registers the search index on the app and, with SEARCH_INDEX_WARM, starts building it in the
+    background so the first search doesn't pay for the build. It's then kept current from committed
+    Company and Fund writes in this worker, plus periodic `updated_at` refreshes for other workers' writes.
+    """
+    app.extensions['search_index'] = {'index': None, 'lock': threading.Lock(), 'refresh_lock': threading.Lock(),
+                                      'watermark': None, 'refreshed_at': 0.0}
+    if not event.contains(Session, 'after_flush', _collect_changes):
+        event.listen(Session, 'after_flush', _collect_changes)
+        event.listen(Session, 'after_commit', _apply_changes)
+        event.listen(Session, 'after_soft_rollback', _discard_changes)
+    if app.config.get('SEARCH_INDEX_WARM'):
+        threading.Thread(target=warm_search_index, args=(app,), name='search-index-warm', daemon=True).start()
+
+
+def _entity_values(obj):
+    entity_type = 'company' if isinstance(obj, Company) else 'fund'
+    return entity_type, obj.id, {field: getattr(obj, field) for field in SEARCH_FIELDS[entity_type]}
+
+
+def _collect_changes(session, flush_context):
+    # Changes are tagged with the innermost transaction, so a savepoint rollback can drop just its own
+    transaction = session.get_nested_transaction() or session.get_transaction()
+    pending = session.info.setdefault('search_index_pending', [])
+    for obj in session.new | session.dirty:
+        if isinstance(obj, (Company, Fund)):
+            entity_type, entity_id, values = _entity_values(obj)
+            pending.append((transaction, (entity_type, entity_id), values))
+    for obj in session.deleted:
+        if isinstance(obj, (Company, Fund)):
+            entity_type, entity_id, _ = _entity_values(obj)
+            pending.append((transaction, (entity_type, entity_id), None))
+
+
+def _apply_changes(session):
+    pending = session.info.pop('search_index_pending', None)
+    if not pending or not has_app_context():
+        return
+    state = current_app.extensions.get('search_index')
+    index = state and state['index']
+    if index is None:
+        return  # Not built yet; the build will read these rows from the database
+    latest = {key: values for _, key, values in pending}  # Last flushed state of each entity
+    for (entity_type, entity_id), values in latest.items():
+        if values is None:
+            index.remove(entity_type, entity_id)
+        else:
+            index.add(entity_type, entity_id, **values)
+
+
+def _within(transaction, ancestor):
+    while transaction is not None:
+        if transaction is ancestor:
+            return True
+        transaction = transaction.parent
+    return False
+
+
+def _discard_changes(session, previous_transaction):
+    pending = session.info.get('search_index_pending')
+    if not pending:
+        return
+    # A rollback undoes everything up to the nearest savepoint, or the whole transaction without one
+    boundary = previous_transaction
+    while boundary.parent is not None and not boundary.nested:
+        boundary = boundary.parent
+    if boundary.parent is None:
+        session.info.pop('search_index_pending', None)
+    else:
+        # What was flushed before the savepoint still commits
+        pending[:] = [change for change in pending if not _within(change[0], boundary)]
@@ -0,0 +1,126 @@
+from datetime import date
+
+import numpy as np
+from services.portfolio_snapshot import NO_DATE
+
+DAYS_PER_YEAR = 365.25
+WATERFALL_STYLES = ('european', 'american')
+TIERS = ('return_of_capital', 'preferred_return', 'lp_catch_up', 'gp_catch_up', 'lp_carry_split', 'gp_carry')
+
+
+class FundCashFlows:
+    """
+    Per-deal cash flows for a set of funds, as parallel arrays with deals grouped by fund.
+    `realized` is what a deal has already returned; `unrealized` is its current mark,
+    treated as if liquidated at that value.
+    """
+
+    def __init__(self, fund_ids, deal_fund_ids, contributed, realized, unrealized, years):
+        self.fund_ids = np.asarray(fund_ids, dtype=np.int64)
+        self.deal_fund_ids = np.asarray(deal_fund_ids, dtype=np.int64)
+        self.contributed = np.asarray(contributed, dtype=np.float64)
+        self.realized = np.asarray(realized, dtype=np.float64)
+        self.unrealized = np.asarray(unrealized, dtype=np.float64)
+        self.years = np.asarray(years, dtype=np.float64)
+        # Start of each fund's block of deals, for np.add.reduceat
+        self.boundaries = np.searchsorted(self.deal_fund_ids, self.fund_ids)
+
+    def __len__(self):
+        return len(self.deal_fund_ids)
+
+    def per_fund(self, deal_values):
+        """Sums (..., deals) values into (..., funds)."""
+        return np.add.reduceat(deal_values, self.boundaries, axis=-1)
+
+
+def load_fund_cash_flows(snapshot, fund_ids, as_of=None):
+    """
+    Builds deal cash flows for `fund_ids` from the portfolio snapshot, the same investments and
+    marks behind calculate_dpi/calculate_tvpi. Funds without investments are left out.
+    """
+    as_of = (as_of or date.today()).toordinal()
+    funds, deal_funds, contributed, realized, unrealized, years = [], [], [], [], [], []
+    for fund_id in sorted(set(fund_ids)):
+        rows = snapshot.fund_rows(fund_id)
+        if not len(rows):
+            continue
+        funds.append(fund_id)
+        for i in rows:
+            deal_funds.append(fund_id)
+            contributed.append(snapshot.amount_invested[i])
+            realized.append(snapshot.exit_amounts[i])
+            unrealized.append(snapshot.current_valuation(i) if snapshot.is_active[i] else 0.0)
+            end = snapshot.exit_dates[i] if snapshot.exit_dates[i] != NO_DATE else as_of
+            years.append(max(0, end - snapshot.investment_dates[i]) / DAYS_PER_YEAR)
+    return FundCashFlows(funds, deal_funds, contributed, realized, unrealized, years)
+
+
+def distribute(contributed, distributed, years, hurdle, carry, catch_up):
+    """
+    Splits `distributed` between LPs and the GP through the standard tiers:
+      1. Return of capital: 100% to LPs until `contributed` is returned.
+      2. Preferred return: 100% to LPs until they have `hurdle` compounded over `years`.
+      3. GP catch-up: `catch_up` of each dollar to the GP until it holds `carry` of the profit so far.
+      4. Carry split: the rest, `carry` to the GP and the remainder to LPs.
+    Every argument is an array (or scalar) and they broadcast together, so any number of
+    funds, deals and scenarios are distributed in one call. Returns a dict of tier arrays.
+    """
+    contributed, distributed, years, hurdle, carry, catch_up = np.broadcast_arrays(
+        *(np.asarray(value, dtype=np.float64) for value in (contributed, distributed, years, hurdle, carry, catch_up)))
+
+    return_of_capital = np.minimum(distributed, contributed)
+    remaining = distributed - return_of_capital
+    preferred_return = np.minimum(remaining, contributed * ((1 + hurdle) ** years - 1))
+    remaining = remaining - preferred_return
+
+    # Catch-up tier size X solves catch_up * X = carry * (preferred_return + X)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        catch_up_size = np.where(catch_up > carry, carry * preferred_return / (catch_up - carry), 0.0)
+    catch_up_tier = np.minimum(remaining, catch_up_size)
+    remaining = remaining - catch_up_tier
+    gp_catch_up = catch_up_tier * catch_up
+    gp_carry = remaining * carry
+
+    return {
+        'return_of_capital': return_of_capital,
+        'preferred_return': preferred_return,
+        'lp_catch_up': catch_up_tier - gp_catch_up,
+        'gp_catch_up': gp_catch_up,
+        'lp_carry_split': remaining - gp_carry,
+        'gp_carry': gp_carry,
+    }
+
+
+def run_waterfall(cash_flows, style='european', hurdle=0.08, carry=0.20, catch_up=1.0, mark_multipliers=1.0):
+    """
+    Runs the waterfall for every fund in `cash_flows` under every scenario at once.
+
+    `hurdle`, `carry`, `catch_up` and `mark_multipliers` may be scalars or 1-D arrays of scenarios
+    (all the same length); `mark_multipliers` scales unrealized marks. European waterfalls pool each
+    fund's deals, compounding the preferred return over the capital-weighted holding period;
+    American waterfalls run deal by deal (no clawback or loss carry-forward) and sum per fund.
+
+    Returns a dict of (scenarios x funds) arrays: one per tier plus 'lp_total', 'gp_total' and
+    'distributed'.
+    """
+    if style not in WATERFALL_STYLES:
+        raise ValueError(f"Unknown waterfall style '{style}'. Use one of: {', '.join(WATERFALL_STYLES)}.")
+    hurdle, carry, catch_up, mark_multipliers = (np.atleast_1d(np.asarray(value, dtype=np.float64))[:, None]
+                                                 for value in (hurdle, carry, catch_up, mark_multipliers))
+    # scenarios x deals
+    distributed = cash_flows.realized + cash_flows.unrealized * mark_multipliers
+
+    if style == 'european':
+        contributed = cash_flows.per_fund(cash_flows.contributed)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            years = np.nan_to_num(cash_flows.per_fund(cash_flows.contributed * cash_flows.years) / contributed)
+        tiers = distribute(contributed, cash_flows.per_fund(distributed), years, hurdle, carry, catch_up)
+    else:
+        tiers = {name: cash_flows.per_fund(values) for name, values in distribute(
+            cash_flows.contributed, distributed, cash_flows.years, hurdle, carry, catch_up).items()}
+
+    tiers['lp_total'] = (tiers['return_of_capital'] + tiers['preferred_return']
+                         + tiers['lp_catch_up'] + tiers['lp_carry_split'])
+    tiers['gp_total'] = tiers['gp_catch_up'] + tiers['gp_carry']
+    tiers['distributed'] = tiers['lp_total'] + tiers['gp_total']
+    return tiers
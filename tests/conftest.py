@@ -0,0 +1,24 @@
+import pytest
+from flask import Flask
+from extensions import db
+from api import api_bp
+from services.search_index import init_search_index
+
+@pytest.fixture
+def app(request, tmp_path):
+    """
+    Bare Flask app on in-memory SQLite with the API blueprint and the search index registered, tables
+    created and an app context pushed. Override config by parametrizing it indirectly:
+    @pytest.mark.parametrize('app', [{'SEARCH_INDEX_REFRESH_SECONDS': 0}], indirect=True)
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:///:memory:"
+    app.config['PRICE_STORE_DIR'] = str(tmp_path / "store")
+    app.config.update(getattr(request, 'param', {}))
+    db.init_app(app)
+    app.register_blueprint(api_bp, url_prefix='/api')
+    init_search_index(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
@@ -0,0 +1,94 @@
+import pytest
+from extensions import db
+from models import Fund, Company, Investment, FinancialData
+from services.fund_calculations import MAX_NAV_POINTS, NavCache, calculate_nav_series, nav_dates
+from datetime import date
+from decimal import Decimal
+
+def add_fund(name="NAV Fund"):
+    fund = Fund(name=name, target_size=Decimal('1000000'), vintage_year=2021)
+    db.session.add(fund)
+    db.session.commit()
+    return fund
+
+def add_investment(fund, name, marks=(), **kwargs):
+    company = Company(name=name, industry="Tech")
+    db.session.add(company)
+    db.session.flush()
+    db.session.add(Investment(fund_id=fund.id, company_id=company.id, investment_date=date(2021, 1, 1),
+                              amount_invested=Decimal('100'), equity_percentage=Decimal('10.0'), **kwargs))
+    for data_date, valuation in marks:
+        db.session.add(FinancialData(company_id=company.id, data_date=data_date,
+                                     valuation=Decimal(valuation) if valuation is not None else None,
+                                     revenue=Decimal('500')))
+    db.session.commit()
+    return company
+
+def test_nav_dates_period_ends():
+    assert nav_dates(date(2021, 2, 10), date(2021, 12, 31), 'Q') == [
+        date(2021, 3, 31), date(2021, 6, 30), date(2021, 9, 30), date(2021, 12, 31)]
+    assert nav_dates(date(2021, 1, 15), date(2021, 3, 15), 'M') == [
+        date(2021, 1, 31), date(2021, 2, 28), date(2021, 3, 15)]
+    # Weeks end on Sunday; 2021-01-06 is a Wednesday
+    assert nav_dates(date(2021, 1, 6), date(2021, 1, 20), 'W') == [
+        date(2021, 1, 10), date(2021, 1, 17), date(2021, 1, 20)]
+
+def test_nav_dates_caps_long_ranges_without_overflowing():
+    for freq in ('D', 'W', 'M'):
+        with pytest.raises(ValueError):
+            nav_dates(date(1, 1, 1), date(9999, 12, 31), freq)
+    assert nav_dates(date(9999, 12, 1), date(9999, 12, 31), 'W')[-1] == date(9999, 12, 31)
+    assert len(nav_dates(date(9000, 1, 1), date(9999, 12, 31), 'Q')) <= MAX_NAV_POINTS
+
+def test_nav_uses_latest_valuation_as_of_each_date(app):
+    fund = add_fund()
+    add_investment(fund, "Marked Co", marks=[(date(2021, 5, 1), '2000'), (date(2021, 8, 1), None),
+                                             (date(2021, 11, 1), '3000')])
+    points = calculate_nav_series(fund.id, date(2021, 1, 1), date(2021, 12, 31), 'Q')
+    # No valuation yet in Q1; the revenue-only mark in Q3 leaves the Q2 valuation in place
+    assert [p['nav'] for p in points] == [0.0, 200.0, 200.0, 300.0]
+    assert points[1]['paid_in'] == pytest.approx(100.0)
+    assert points[1]['tvpi'] == pytest.approx(2.0)
+
+def test_exits_count_as_distributions_from_the_exit_date(app):
+    fund = add_fund()
+    add_investment(fund, "Sold Co", marks=[(date(2021, 2, 1), '2000')], status='Exited',
+                   exit_date=date(2021, 8, 15), exit_amount=Decimal('250'))
+    add_investment(fund, "Undated Co", status='Exited', exit_amount=Decimal('50'))
+    points = calculate_nav_series(fund.id, date(2021, 1, 1), date(2021, 12, 31), 'Q')
+    assert [p['nav'] for p in points] == [200.0, 200.0, 0.0, 0.0]
+    # Exits without a date only show up in the last point
+    assert [p['distributions'] for p in points] == [0.0, 0.0, 250.0, 300.0]
+    assert points[-1]['tvpi'] == pytest.approx(1.5)
+
+def test_cached_points_follow_new_marks(app):
+    fund = add_fund()
+    company = add_investment(fund, "Cached Co", marks=[(date(2021, 5, 1), '2000')])
+    assert calculate_nav_series(fund.id, date(2021, 1, 1), date(2021, 12, 31), 'Q')[2]['nav'] == 200.0
+    # Backdated into an already cached (closed) period
+    db.session.add(FinancialData(company_id=company.id, data_date=date(2021, 7, 1), valuation=Decimal('5000')))
+    db.session.commit()
+    assert calculate_nav_series(fund.id, date(2021, 1, 1), date(2021, 12, 31), 'Q')[2]['nav'] == 500.0
+
+def test_nav_cache_is_bounded():
+    cache = NavCache(max_funds=2, max_points=2)
+    days = [date(2021, 1, d) for d in range(1, 4)]
+    cache.put(1, 'stamp', {d: {} for d in days})
+    assert list(cache.get(1, 'stamp', days)) == days[1:]
+    cache.put(2, 'stamp', {days[0]: {}})
+    cache.put(3, 'stamp', {days[0]: {}})
+    assert cache.get(1, 'stamp', days) == {}
+    assert cache.get(3, 'other stamp', days) == {}
+
+def test_nav_endpoint(app):
+    fund = add_fund()
+    add_investment(fund, "Endpoint Co", marks=[(date(2021, 5, 1), '2000')])
+    client = app.test_client()
+    response = client.get(f'/api/funds/{fund.id}/nav?from=2021-01-01&to=2021-12-31&freq=Q')
+    assert response.status_code == 200
+    assert [p['date'] for p in response.json['points']] == ["2021-03-31", "2021-06-30", "2021-09-30", "2021-12-31"]
+    assert client.get(f'/api/funds/{fund.id}/nav?freq=Y').status_code == 400
+    assert client.get(f'/api/funds/{fund.id}/nav?from=2022-01-01&to=2021-01-01').status_code == 400
+    assert client.get(f'/api/funds/{fund.id}/nav?from=01-01-2021').status_code == 400
+    assert client.get(f'/api/funds/{fund.id}/nav?from=0001-01-01&to=9999-12-31&freq=W').status_code == 400
+    assert client.get('/api/funds/999/nav').status_code == 404
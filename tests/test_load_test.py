@@ -0,0 +1,11 @@
+from load_test import DEFAULT_MIX, parse_mix, run_load_test
+
+def test_parse_mix():
+    assert parse_mix("funds=2,search=1") == {'funds': 2, 'search': 1}
+
+def test_load_test_smoke():
+    results, elapsed = run_load_test(num_funds=2, companies_per_fund=1, num_requests=20, clients=2)
+    assert len(results) == 20
+    assert [kind for kind, latency, ok in results if not ok] == []
+    assert {kind for kind, latency, ok in results} <= set(DEFAULT_MIX)
+    assert elapsed > 0
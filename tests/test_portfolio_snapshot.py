@@ -0,0 +1,95 @@
+import pytest
+from extensions import db
+from models import Fund, Company, Investment, FinancialData
+from services.portfolio_snapshot import PortfolioSnapshot
+from datetime import date
+from decimal import Decimal
+
+def add_investment(fund, name, amount, equity, valuation, **kwargs):
+    company = Company(name=name, industry="Tech")
+    db.session.add(company)
+    db.session.flush()
+    investment = Investment(fund_id=fund.id, company_id=company.id, investment_date=date(2021, 1, 1),
+                            amount_invested=Decimal(amount), equity_percentage=Decimal(equity), **kwargs)
+    db.session.add(investment)
+    if valuation is not None:
+        db.session.add(FinancialData(company_id=company.id, data_date=date(2022, 1, 1), valuation=Decimal(valuation)))
+    db.session.commit()
+    return company, investment
+
+def test_fund_totals_match_orm_rules(app):
+    fund = Fund(name="Snapshot Fund", target_size=Decimal('1000000'), vintage_year=2021)
+    db.session.add(fund)
+    db.session.commit()
+    add_investment(fund, "Marked Co", '100000', '10.0', '2000000')
+    add_investment(fund, "Exited Co", '50000', '5.0', None, status='Exited', exit_amount=Decimal('150000'))
+
+    snapshot = PortfolioSnapshot()
+    snapshot.refresh()
+    paid_in, distributions, remaining = snapshot.fund_totals(fund.id)
+    assert paid_in == pytest.approx(150000)
+    assert distributions == pytest.approx(150000)
+    assert remaining == pytest.approx(200000)  # Exited positions carry no remaining value
+
+def test_refresh_picks_up_new_marks_and_investments(app):
+    fund = Fund(name="Delta Fund", target_size=Decimal('1000000'), vintage_year=2021)
+    db.session.add(fund)
+    db.session.commit()
+    company, _ = add_investment(fund, "Growing Co", '100000', '10.0', '1000000')
+
+    snapshot = PortfolioSnapshot()
+    snapshot.refresh()
+    version = snapshot.version
+    assert snapshot.refresh() is False  # Nothing changed
+    assert snapshot.version == version
+
+    db.session.add(FinancialData(company_id=company.id, data_date=date(2023, 1, 1), valuation=Decimal('3000000')))
+    db.session.commit()
+    add_investment(fund, "New Co", '50000', '1.0', None)
+
+    assert snapshot.refresh() is True
+    paid_in, _, remaining = snapshot.fund_totals(fund.id)
+    assert paid_in == pytest.approx(150000)
+    assert remaining == pytest.approx(300000)
+    assert len(snapshot) == 2
+
+def test_backdated_mark_does_not_replace_latest(app):
+    fund = Fund(name="Backdated Fund", target_size=Decimal('1000000'), vintage_year=2021)
+    db.session.add(fund)
+    db.session.commit()
+    company, _ = add_investment(fund, "Steady Co", '100000', '10.0', '2000000')
+
+    snapshot = PortfolioSnapshot()
+    snapshot.refresh()
+    db.session.add(FinancialData(company_id=company.id, data_date=date(2021, 6, 1), valuation=Decimal('500000')))
+    db.session.commit()
+    snapshot.refresh()
+    assert snapshot.latest_valuation(company.id) == pytest.approx(2000000)
+
+def test_refresh_skips_while_another_refresh_runs(app):
+    fund = Fund(name="Busy Fund", target_size=Decimal('1000000'), vintage_year=2021)
+    db.session.add(fund)
+    db.session.commit()
+    add_investment(fund, "First Co", '100000', '10.0', None)
+
+    snapshot = PortfolioSnapshot()
+    snapshot.refresh()
+    add_investment(fund, "Second Co", '50000', '1.0', None)
+    with snapshot._refresh_lock:
+        assert snapshot.refresh() is False  # Doesn't queue behind the running refresh
+    assert snapshot.refresh() is True
+    assert len(snapshot) == 2
+
+def test_metrics_endpoint_refreshes_once(app, monkeypatch):
+    fund = Fund(name="Metrics Fund", target_size=Decimal('1000000'), vintage_year=2021)
+    db.session.add(fund)
+    db.session.commit()
+    add_investment(fund, "Metrics Co", '100000', '10.0', '2000000')
+
+    refreshes = []
+    refresh = PortfolioSnapshot.refresh
+    monkeypatch.setattr(PortfolioSnapshot, 'refresh', lambda self, *args: refreshes.append(1) or refresh(self, *args))
+    response = app.test_client().get(f'/api/funds/{fund.id}/metrics')
+    assert response.status_code == 200
+    assert float(response.json['tvpi']) == pytest.approx(2.0)
+    assert len(refreshes) == 1
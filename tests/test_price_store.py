@@ -0,0 +1,160 @@
+import json
+import os
+import numpy as np
+import pytest
+from extensions import db
+from models import Fund, Company, Investment, FinancialData
+from services.fund_calculations import calculate_nav_series
+from services.portfolio_snapshot import PortfolioSnapshot
+from services.price_store import (CURRENT_FILE, TICKERS_FILE, PriceStore, PublicPositions, current_version,
+                                  import_price_files, load_public_positions, mark_to_market, position_prices)
+from datetime import date, timedelta
+from decimal import Decimal
+
+def write_prices(path, rows):
+    path.write_text("date,ticker,close\n" + "".join(f"{d},{t},{p}\n" for d, t, p in rows))
+    return str(path)
+
+@pytest.fixture
+def store(tmp_path):
+    prices = write_prices(tmp_path / "prices.csv", [
+        ("2024-01-02", "AAA", "10.0"), ("2024-01-02", "BBB", "100.0"),
+        ("2024-01-03", "AAA", "11.0"),  # BBB has no close on the 3rd
+        ("2024-01-04", "AAA", "12.0"), ("2024-01-04", "bbb", "90.0"),
+    ])
+    import_price_files([prices], str(tmp_path / "store"))
+    return PriceStore(str(tmp_path / "store"))
+
+def test_import_and_asof_lookup(store):
+    assert store.tickers == ["AAA", "BBB"]
+    assert store.price_on("AAA", date(2024, 1, 3)) == 11.0
+    assert store.price_on("BBB", date(2024, 1, 3)) == 100.0  # Forward-filled from the 2nd
+    assert store.price_on("AAA", date(2024, 1, 6)) == 12.0  # Weekend uses Friday's close
+    assert store.price_on("AAA", date(2024, 1, 1)) is None
+
+def test_import_merges_with_existing_store(store, tmp_path):
+    more = write_prices(tmp_path / "more.csv", [("2024-01-05", "CCC", "5.0"), ("2024-01-04", "AAA", "12.5")])
+    import_price_files([more], store.directory)
+    merged = PriceStore(store.directory)
+    assert merged.tickers == ["AAA", "BBB", "CCC"]
+    assert merged.price_on("AAA", date(2024, 1, 4)) == 12.5
+    assert merged.price_on("BBB", date(2024, 1, 2)) == 100.0
+    assert merged.price_on("CCC", date(2024, 1, 5)) == 5.0
+
+def test_mark_to_market_sums_positions_per_fund(store):
+    positions = PublicPositions(
+        fund_ids=[2, 1, 1],
+        columns=[0, 0, 1],
+        shares=[10.0, 100.0, 2.0],
+        start_ordinals=[date(2024, 1, 3).toordinal(), date(2024, 1, 1).toordinal(), date(2024, 1, 1).toordinal()],
+        end_ordinals=[date(2030, 1, 1).toordinal(), date(2030, 1, 1).toordinal(), date(2024, 1, 4).toordinal()],
+    )
+    dates, fund_ids, values = mark_to_market(store, positions, date(2024, 1, 1), date(2024, 1, 4))
+    assert dates == [date(2024, 1, 2), date(2024, 1, 3), date(2024, 1, 4)]
+    assert fund_ids == [1, 2]
+    np.testing.assert_allclose(values, [
+        [100 * 10.0 + 2 * 100.0, 0.0],
+        [100 * 11.0 + 2 * 100.0, 10 * 11.0],
+        [100 * 12.0, 10 * 12.0],  # Fund 1's BBB position exited on the 4th
+    ])
+    _, _, chunked = mark_to_market(store, positions, date(2024, 1, 1), date(2024, 1, 4), chunk_rows=1)
+    np.testing.assert_allclose(chunked, values)
+
+def test_position_prices_are_per_position(store):
+    positions = PublicPositions(fund_ids=[1, 1], columns=[0, 1], shares=[1.0, 1.0], start_ordinals=[0, 0],
+                                end_ordinals=[0, 0])
+    ordinals = [date(2024, 1, d).toordinal() for d in (1, 3, 31)]
+    np.testing.assert_allclose(position_prices(store, positions, ordinals), [
+        [np.nan, np.nan],
+        [11.0, 100.0],
+        [np.nan, np.nan],  # More than MAX_STALE_DAYS past the last trading date
+    ])
+    assert np.isnan(position_prices(store, positions, ordinals[1:2], max_stale_rows=0)[0, 1])
+
+def test_imports_publish_new_versions(store, tmp_path):
+    first = store.version
+    import_price_files([write_prices(tmp_path / "a.csv", [("2024-01-05", "AAA", "13.0")])], store.directory)
+    second = current_version(store.directory)
+    import_price_files([write_prices(tmp_path / "b.csv", [("2024-01-08", "AAA", "14.0")])], store.directory)
+    third = current_version(store.directory)
+    assert len({first, second, third}) == 3
+    # The previous version stays for readers still opening it; older ones are removed
+    assert sorted(name for name in os.listdir(store.directory) if name != CURRENT_FILE) == [second, third]
+    assert store.price_on("AAA", date(2024, 1, 4)) == 12.0  # An open store keeps reading its own version
+    assert PriceStore(store.directory).price_on("AAA", date(2024, 1, 8)) == 14.0
+
+def test_mismatched_store_is_rejected(store):
+    with open(os.path.join(store.directory, store.version, TICKERS_FILE), 'w') as f:
+        json.dump(["AAA"], f)
+    with pytest.raises(ValueError):
+        PriceStore(store.directory)
+
+def add_public_investment(fund, name, ticker, marks=(), **kwargs):
+    company = Company(name=name, is_public=True, ticker_symbol=ticker)
+    db.session.add(company)
+    db.session.flush()
+    db.session.add(Investment(fund_id=fund.id, company_id=company.id, investment_date=date(2024, 1, 2),
+                              amount_invested=Decimal('1000'), equity_percentage=Decimal('10.0'), **kwargs))
+    for data_date, valuation, stock_price in marks:
+        db.session.add(FinancialData(company_id=company.id, data_date=data_date, valuation=Decimal(valuation),
+                                     stock_price=Decimal(stock_price) if stock_price else None))
+    db.session.commit()
+    return company
+
+def test_load_public_positions_sizes_from_marks_or_cost(app, store):
+    fund = Fund(name="Public Fund", target_size=Decimal('1000000'), vintage_year=2024)
+    other = Fund(name="Other Fund", target_size=Decimal('1000000'), vintage_year=2024)
+    db.session.add_all([fund, other])
+    db.session.commit()
+    # 10% of the 5,000 shares implied by a 500,000 valuation at 100.00 a share
+    add_public_investment(fund, "Implied Co", "bbb", marks=[(date(2024, 1, 2), '500000', '100.0')])
+    # No valuation with a stock price: 1,000 invested at the 10.00 close on the investment date
+    add_public_investment(fund, "Cost Co", "AAA", marks=[(date(2024, 1, 2), '900000', None)])
+    add_public_investment(fund, "Unlisted Co", "ZZZ")
+    add_public_investment(other, "Other Co", "AAA")
+    snapshot = PortfolioSnapshot()
+    snapshot.refresh()
+
+    positions = load_public_positions(snapshot, store, [fund.id])
+    shares = {store.tickers[column]: held for column, held in zip(positions.columns, positions.shares)}
+    assert shares == pytest.approx({"BBB": 500.0, "AAA": 100.0})
+    assert set(positions.fund_ids) == {fund.id}
+    assert len(load_public_positions(snapshot, store)) == 3
+
+def test_nav_marks_public_positions_to_market(app, store):
+    fund = Fund(name="Marked Fund", target_size=Decimal('1000000'), vintage_year=2024)
+    db.session.add(fund)
+    db.session.commit()
+    add_public_investment(fund, "Listed Co", "AAA", marks=[(date(2024, 1, 2), '20000', None)])
+    points = calculate_nav_series(fund.id, date(2024, 1, 1), date(2024, 1, 31), 'D')
+    nav = {p['date']: p['nav'] for p in points}
+    assert nav['2024-01-01'] == 0.0
+    assert nav['2024-01-03'] == pytest.approx(100 * 11.0)  # 100 shares, not 10% of the 20,000 mark
+    assert nav['2024-01-06'] == pytest.approx(100 * 12.0)  # Weekend uses Friday's close
+    # Past the end of the store's prices, the valuation mark takes over again
+    assert nav['2024-01-31'] == pytest.approx(2000.0)
+
+def test_nav_keeps_marks_until_each_ticker_trades(app, tmp_path):
+    days = (date(2022, 1, 3) + timedelta(days=i) for i in range(363))
+    weekdays = [d for d in days if d.weekday() < 5]
+    prices = write_prices(tmp_path / "2022.csv", [(d, "AAA", "10.0") for d in weekdays] +
+                                                 [(d, "LATE", "25.0") for d in weekdays if d >= date(2022, 6, 1)])
+    import_price_files([prices], str(tmp_path / "store"))
+    fund = Fund(name="Late Listing Fund", target_size=Decimal('1000000'), vintage_year=2022)
+    db.session.add(fund)
+    db.session.commit()
+    for name, ticker, mark in (("Listed Co", "AAA", None), ("Late Co", "LATE", (date(2022, 1, 1), '2000000', '20.0'))):
+        company = Company(name=name, is_public=True, ticker_symbol=ticker)
+        db.session.add(company)
+        db.session.flush()
+        db.session.add(Investment(fund_id=fund.id, company_id=company.id, investment_date=date(2022, 1, 3),
+                                  amount_invested=Decimal('1000'), equity_percentage=Decimal('10.0')))
+        if mark:
+            db.session.add(FinancialData(company_id=company.id, data_date=mark[0], valuation=Decimal(mark[1]),
+                                         stock_price=Decimal(mark[2])))
+    db.session.commit()
+
+    nav = [p['nav'] for p in calculate_nav_series(fund.id, date(2022, 1, 1), date(2022, 12, 31), 'M')]
+    # Listed Co: 100 shares at 10.00. Late Co: 10% of 2,000,000 until LATE trades, then 10,000 shares at 25.00
+    assert nav[:5] == pytest.approx([1000.0 + 200000.0] * 5)
+    assert nav[5:] == pytest.approx([1000.0 + 250000.0] * 7)
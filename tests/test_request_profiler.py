@@ -0,0 +1,84 @@
+import pytest
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager, create_access_token
+from app import create_app
+from config import Config
+from services.request_profiler import init_request_profiler
+
+def make_app(tmp_path, **config):
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='test', JWT_SECRET_KEY='test-jwt-secret-key-with-enough-bytes', TESTING=True,
+                      PROFILING_DIR=str(tmp_path), PROFILING_MAX_CAPTURES=2, PROFILING_ADMINS=['admin'], **config)
+    JWTManager(app)
+    init_request_profiler(app)
+
+    @app.route('/api/funds/<int:fund_id>/metrics')
+    def metrics(fund_id):
+        return jsonify({"tvpi": 1.0}), 200
+
+    return app
+
+def token_headers(tmp_path, identity):
+    app = make_app(tmp_path)
+    with app.app_context():
+        return {"Authorization": f"Bearer {create_access_token(identity=identity)}"}
+
+@pytest.fixture
+def auth_headers(tmp_path):
+    return token_headers(tmp_path, 'admin')
+
+def test_profiling_disabled_registers_nothing(tmp_path):
+    app = make_app(tmp_path)
+    client = app.test_client()
+    response = client.get('/api/funds/1/metrics', headers={"X-Profile-Request": "1"})
+    assert 'X-Profile-Id' not in response.headers
+    assert client.get('/api/admin/profiles').status_code == 404
+    assert list(tmp_path.iterdir()) == []
+
+def test_profile_header_requires_authentication(tmp_path, auth_headers):
+    client = make_app(tmp_path, PROFILING_ENABLED=True).test_client()
+    response = client.get('/api/funds/1/metrics', headers={"X-Profile-Request": "1"})
+    assert 'X-Profile-Id' not in response.headers
+
+    response = client.get('/api/funds/1/metrics', headers={"X-Profile-Request": "1", **auth_headers})
+    assert 'X-Profile-Id' in response.headers
+
+def test_captures_are_bounded_and_listed(tmp_path, auth_headers):
+    client = make_app(tmp_path, PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0).test_client()
+    capture_ids = [client.get(f'/api/funds/{i}/metrics').headers['X-Profile-Id'] for i in range(4)]
+
+    response = client.get('/api/admin/profiles', headers=auth_headers)
+    assert response.status_code == 200
+    # Ring buffer keeps only the newest PROFILING_MAX_CAPTURES
+    listed = [capture['id'] for capture in response.json if capture['path'].startswith('/api/funds/')]
+    assert listed[:2] == capture_ids[:1:-1]
+    assert len(list(tmp_path.glob('*.prof'))) == 2
+
+    download = client.get(f"/api/admin/profiles/{capture_ids[-1]}", headers=auth_headers)
+    assert download.status_code == 200
+    # The capture endpoints themselves are never sampled
+    assert 'X-Profile-Id' not in download.headers
+
+def test_non_admins_cannot_profile_or_read_captures(tmp_path):
+    client = make_app(tmp_path, PROFILING_ENABLED=True).test_client()
+    user_headers = token_headers(tmp_path, 'someone')
+    response = client.get('/api/funds/1/metrics', headers={"X-Profile-Request": "1", **user_headers})
+    assert 'X-Profile-Id' not in response.headers
+    assert client.get('/api/admin/profiles', headers=user_headers).status_code == 403
+    assert client.get('/api/admin/profiles').status_code == 401
+
+def test_failed_capture_does_not_fail_the_request(tmp_path, monkeypatch):
+    app = make_app(tmp_path, PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0)
+    def disk_full(*args):
+        raise OSError("No space left on device")
+    monkeypatch.setattr(app.extensions['request_profiler'], 'save', disk_full)
+    response = app.test_client().get('/api/funds/1/metrics')
+    assert response.status_code == 200
+    assert 'X-Profile-Id' not in response.headers
+
+@pytest.mark.parametrize('env', ['development', 'production'])
+def test_create_app_loads_profiling_config_in_every_env(monkeypatch, env):
+    monkeypatch.setenv('FLASK_ENV', env)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': "sqlite:///:memory:", 'SEARCH_INDEX_WARM': False})
+    for key in ('PROFILING_ENABLED', 'PROFILING_HEADER', 'PROFILING_ADMINS', 'PROFILING_DIR'):
+        assert app.config[key] == getattr(Config, key)
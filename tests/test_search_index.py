@@ -0,0 +1,101 @@
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import Fund, Company
+from services.search_index import (EXACT, PREFIX, SUBSTRING, WORD_PREFIX, SearchIndex, get_search_index,
+                                   warm_search_index)
+from datetime import datetime
+from decimal import Decimal
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.add('company', 1, name="Acme Robotics", ticker_symbol="ACME", industry="Automation")
+    index.add('company', 2, name="Robotic Foods", ticker_symbol=None, industry="Food")
+    index.add('company', 3, name="Nanorobot Labs", ticker_symbol="NANO", industry="Biotech")
+    index.add('fund', 1, name="Robotics Fund I")
+    return index
+
+def test_ranks_exact_then_prefix_then_word_prefix_then_substring(index):
+    results = index.search("robot")
+    assert [(r['type'], r['id'], r['match']) for r in results] == [
+        ('company', 2, PREFIX),
+        ('fund', 1, PREFIX),
+        ('company', 1, WORD_PREFIX),
+        ('company', 3, SUBSTRING),
+    ]
+    assert index.search("acme")[0]['match'] == EXACT
+
+def test_limit_and_type_filter(index):
+    assert len(index.search("robot", limit=2)) == 2
+    assert [r['type'] for r in index.search("robot", entity_type='fund')] == ['fund']
+    assert index.search("") == []
+
+def test_update_and_remove(index):
+    index.add('company', 2, name="Plant Foods", industry="Food")
+    assert all(r['id'] != 2 for r in index.search("robotic", entity_type='company'))
+    assert index.search("plant")[0]['id'] == 2
+    index.remove('company', 1)
+    assert index.search("acme") == []
+    assert len(index) == 3
+
+def test_index_follows_committed_writes(app):
+    db.session.add(Company(name="Existing Co", industry="Tech"))
+    db.session.commit()
+    assert get_search_index().search("existing")[0]['name'] == "Existing Co"
+
+    fund = Fund(name="Searchable Fund", target_size=Decimal('1000000'), vintage_year=2024)
+    db.session.add(fund)
+    db.session.commit()
+    assert get_search_index().search("searchable")[0]['id'] == fund.id
+
+    db.session.add(Company(name="Rolled Back Co"))
+    db.session.flush()
+    db.session.rollback()
+    assert get_search_index().search("rolled") == []
+
+    fund.name = "Renamed Fund"
+    db.session.commit()
+    assert get_search_index().search("searchable") == []
+    assert get_search_index().search("renamed")[0]['id'] == fund.id
+
+    db.session.delete(fund)
+    db.session.commit()
+    assert get_search_index().search("renamed") == []
+
+def test_savepoint_rollback_keeps_outer_changes(app):
+    get_search_index()
+    db.session.add(Company(name="Outer Co"))
+    db.session.flush()
+    try:
+        with db.session.begin_nested():
+            db.session.add(Company(name="Inner Co"))
+            db.session.flush()
+            db.session.add(Company(name="Outer Co"))  # Duplicate name
+            db.session.flush()
+    except IntegrityError:
+        pass
+    db.session.commit()
+    assert [r['name'] for r in get_search_index().search("outer")] == ["Outer Co"]
+    assert get_search_index().search("inner") == []
+
+@pytest.mark.parametrize('app', [{'SEARCH_INDEX_REFRESH_SECONDS': 0}], indirect=True)
+def test_index_picks_up_writes_from_other_workers(app):
+    assert get_search_index().search("elsewhere") == []
+    # Written without the ORM, as another worker's write looks to this one
+    db.session.execute(insert(Company).values(name="Elsewhere Co", updated_at=datetime.utcnow()))
+    db.session.execute(insert(Fund).values(name="Elsewhere Fund", target_size=1000000, vintage_year=2024,
+                                           updated_at=datetime.utcnow()))
+    db.session.commit()
+    assert {r['type'] for r in get_search_index().search("elsewhere")} == {'company', 'fund'}
+
+def test_warm_builds_index_before_first_search(app):
+    db.drop_all()
+    warm_search_index(app)  # No tables yet: leaves the build to the first search
+    assert app.extensions['search_index']['index'] is None
+    db.create_all()
+    db.session.add(Company(name="Warm Co"))
+    db.session.commit()
+    warm_search_index(app)
+    assert len(app.extensions['search_index']['index']) == 1
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+from extensions import db
+from models import Fund, Company, Investment, FinancialData
+from services.portfolio_snapshot import PortfolioSnapshot
+from services.waterfall import FundCashFlows, distribute, load_fund_cash_flows, run_waterfall
+from datetime import date
+from decimal import Decimal
+
+def test_distribute_tiers_with_full_catch_up():
+    tiers = distribute(contributed=100.0, distributed=200.0, years=1.0, hurdle=0.08, carry=0.20, catch_up=1.0)
+    assert tiers['return_of_capital'] == pytest.approx(100.0)
+    assert tiers['preferred_return'] == pytest.approx(8.0)
+    assert tiers['gp_catch_up'] == pytest.approx(2.0)
+    assert tiers['gp_carry'] == pytest.approx(18.0)
+    assert tiers['lp_carry_split'] == pytest.approx(72.0)
+    # With a full catch-up the GP ends up with exactly `carry` of the profit
+    assert tiers['gp_catch_up'] + tiers['gp_carry'] == pytest.approx(0.20 * 100.0)
+
+def test_distribute_below_hurdle_pays_no_carry():
+    tiers = distribute(contributed=100.0, distributed=105.0, years=1.0, hurdle=0.08, carry=0.20, catch_up=1.0)
+    assert tiers['preferred_return'] == pytest.approx(5.0)
+    assert tiers['gp_catch_up'] + tiers['gp_carry'] == pytest.approx(0.0)
+
+@pytest.fixture
+def cash_flows():
+    # Fund 1: one big winner and one total loss. Fund 2: a single deal returning its capital.
+    return FundCashFlows(
+        fund_ids=[1, 2],
+        deal_fund_ids=[1, 1, 2],
+        contributed=[100.0, 100.0, 50.0],
+        realized=[300.0, 0.0, 0.0],
+        unrealized=[0.0, 0.0, 50.0],
+        years=[1.0, 1.0, 1.0],
+    )
+
+def test_american_pays_carry_on_winners_despite_fund_level_losses(cash_flows):
+    european = run_waterfall(cash_flows, 'european', hurdle=0.0, carry=0.20, catch_up=1.0)
+    american = run_waterfall(cash_flows, 'american', hurdle=0.0, carry=0.20, catch_up=1.0)
+    assert european['gp_total'][0, 0] == pytest.approx(0.20 * (300.0 - 200.0))
+    assert american['gp_total'][0, 0] == pytest.approx(0.20 * (300.0 - 100.0))
+    np.testing.assert_allclose(european['distributed'], [[300.0, 50.0]])
+    np.testing.assert_allclose(american['lp_total'] + american['gp_total'], [[300.0, 50.0]])
+
+def test_scenarios_are_batched(cash_flows):
+    result = run_waterfall(cash_flows, 'european', hurdle=0.0, carry=[0.20, 0.10, 0.20],
+                           catch_up=1.0, mark_multipliers=[1.0, 1.0, 3.0])
+    assert result['gp_total'].shape == (3, 2)
+    np.testing.assert_allclose(result['gp_total'][:, 0], [20.0, 10.0, 20.0])
+    # Fund 2's mark tripled: 100 of profit, 20% carried
+    assert result['gp_total'][2, 1] == pytest.approx(20.0)
+
+def test_unknown_style_raises(cash_flows):
+    with pytest.raises(ValueError):
+        run_waterfall(cash_flows, 'asian')
+
+def add_fund_with_deals(name):
+    fund = Fund(name=name, target_size=Decimal('1000000'), vintage_year=2020)
+    db.session.add(fund)
+    db.session.flush()
+    winner = Company(name=f"{name} Winner")
+    exited = Company(name=f"{name} Exit")
+    db.session.add_all([winner, exited])
+    db.session.flush()
+    db.session.add_all([
+        Investment(fund_id=fund.id, company_id=winner.id, investment_date=date(2020, 1, 1),
+                   amount_invested=Decimal('100'), equity_percentage=Decimal('10.0')),
+        Investment(fund_id=fund.id, company_id=exited.id, investment_date=date(2020, 1, 1),
+                   amount_invested=Decimal('100'), equity_percentage=Decimal('10.0'), status='Exited',
+                   exit_date=date(2022, 1, 1), exit_amount=Decimal('150')),
+        FinancialData(company_id=winner.id, data_date=date(2021, 6, 30), valuation=Decimal('2000')),
+    ])
+    db.session.commit()
+    return fund
+
+def test_load_fund_cash_flows_from_snapshot(app):
+    fund = add_fund_with_deals("Cash Flow Fund")
+    empty = Fund(name="Empty Fund", target_size=Decimal('1000000'), vintage_year=2020)
+    db.session.add(empty)
+    db.session.commit()
+    snapshot = PortfolioSnapshot()
+    snapshot.refresh()
+
+    cash_flows = load_fund_cash_flows(snapshot, [fund.id, empty.id], as_of=date(2021, 1, 1))
+    assert cash_flows.fund_ids.tolist() == [fund.id]  # Funds without investments are left out
+    order = np.argsort(cash_flows.realized)
+    np.testing.assert_allclose(cash_flows.contributed, [100.0, 100.0])
+    np.testing.assert_allclose(cash_flows.realized[order], [0.0, 150.0])
+    np.testing.assert_allclose(cash_flows.unrealized[order], [200.0, 0.0])  # Exited deals carry no mark
+    # Held to `as_of`, or to the exit date once exited
+    np.testing.assert_allclose(cash_flows.years[order], [366 / 365.25, 731 / 365.25])
+
+def test_waterfall_endpoint(app):
+    fund = add_fund_with_deals("Endpoint Fund")
+    client = app.test_client()
+    response = client.get(f'/api/funds/{fund.id}/waterfall?hurdle=0&carry=0.2')
+    assert response.status_code == 200
+    assert response.json['distributed'] == pytest.approx(350.0)
+    assert response.json['gp_total'] == pytest.approx(0.2 * 150.0)
+    assert response.json['lp_total'] + response.json['gp_total'] == pytest.approx(350.0)
+    assert client.get('/api/funds/999/waterfall').status_code == 404
+
+@pytest.mark.parametrize('query', [
+    'style=asian', 'carry=abc', 'carry=nan', 'hurdle=inf', 'carry=-5', 'carry=1.5', 'catch_up=2',
+    'hurdle=-0.1', 'mark_multiplier=-1',
+])
+def test_waterfall_endpoint_rejects_invalid_parameters(app, query):
+    fund = add_fund_with_deals("Invalid Params Fund")
+    assert app.test_client().get(f'/api/funds/{fund.id}/waterfall?{query}').status_code == 400